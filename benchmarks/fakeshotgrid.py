@@ -0,0 +1,345 @@
+import json
+import random
+import struct
+import threading
+import time
+import urllib.parse
+import zlib
+from dataclasses import dataclass
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+LOGIN = 'bench'
+PASSWORD = 'bench'
+SESSION_TOKEN = 'bench-session'
+WRITE_CHUNK = 64 * 1024
+STATUSES = ['wtg', 'rdy', 'ip', 'rev', 'fin']
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_HEIGHT = 90
+
+
+def thumbnailPng(seed: int) -> bytes:
+    # A flat-coloured PNG, different for every entity.
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    colour = bytes([seed * 67 % 256, seed * 131 % 256, seed * 199 % 256])
+    rows = b''.join(b'\0' + colour * THUMBNAIL_WIDTH for _ in range(THUMBNAIL_HEIGHT))
+    return (b'\x89PNG\r\n\x1a\n' +
+            chunk(b'IHDR', struct.pack('>IIBBBBB', THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT, 8, 2, 0, 0, 0)) +
+            chunk(b'IDAT', zlib.compress(rows)) + chunk(b'IEND', b''))
+
+
+@dataclass
+class ServerConfig:
+    # `latency` (seconds) is added to every request, `bandwidth` (bytes per
+    # second, per connection) throttles file bodies in both directions and
+    # `throttleRate` is the share of requests turned away with a 429.
+    tasks: int = 100
+    versionsPerTask: int = 2
+    filesPerVersion: int = 1
+    fileSize: int = 1024 * 1024
+    latency: float = 0.0
+    bandwidth: Optional[float] = None
+    throttleRate: float = 0.0
+
+
+def entityLink(entity: Dict[str, Any]) -> Dict[str, Any]:
+    link = {'type': entity['type'], 'id': entity['id']}
+    name = entity.get('content') or entity.get('code') or entity.get('name')
+    if name is not None:
+        link['name'] = name
+    return link
+
+
+def sameEntity(a: Any, b: Any) -> bool:
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.get('type') == b.get('type') and a.get('id') == b.get('id')
+    return a == b
+
+
+def matches(entity: Dict[str, Any], condition: Dict[str, Any]) -> bool:
+    if 'conditions' in condition:
+        results = [matches(entity, nested) for nested in condition['conditions']]
+        return all(results) if condition['logical_operator'] == 'and' else any(results)
+
+    value = entity.get(condition['path'])
+    relation = condition['relation']
+    values = condition['values']
+    candidates = value if isinstance(value, list) else [value]
+
+    if relation == 'is':
+        return any(sameEntity(candidate, values[0]) for candidate in candidates)
+    if relation == 'in':
+        return any(sameEntity(candidate, wanted) for candidate in candidates for wanted in values)
+    if relation == 'contains':
+        return value is not None and str(values[0]).lower() in str(value).lower()
+    if relation == 'greater_than':
+        return value is not None and str(value) > str(values[0])
+    raise Exception("Unsupported relation: " + relation)
+
+
+def sortKey(field: str) -> Callable[[Dict[str, Any]], Tuple[bool, Any]]:
+    return lambda entity: (entity.get(field) is not None, entity.get(field) or 0)
+
+
+class FakeShotgrid:
+    # A throwaway in-memory site: one HumanUser assigned to `config.tasks`
+    # tasks, each with versions and attachments whose files are served with
+    # Range support. Answers the JSON-RPC calls and upload endpoints the app
+    # uses, nothing else.
+    config: ServerConfig
+    entities: Dict[str, Dict[int, Dict[str, Any]]]
+    payload: bytes
+    uploads: Dict[str, int]
+    lock: threading.Lock
+
+    def __init__(self, config: ServerConfig) -> None:
+        self.config = config
+        self.ids = count(1)
+        self.entities = {'HumanUser': {}, 'Project': {}, 'Task': {}, 'Version': {}, 'Attachment': {}}
+        self.payload = bytes(range(256)) * (config.fileSize // 256) + bytes(config.fileSize % 256)
+        self.uploads = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+        self.populate()
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def add(self, entityType: str, **fields: Any) -> Dict[str, Any]:
+        entity = dict(fields, type=entityType, id=next(self.ids))
+        self.entities[entityType][entity['id']] = entity
+        return entity
+
+    def populate(self):
+        user = self.add('HumanUser', login=LOGIN, name='Benchmark')
+        project = self.add('Project', name='Benchmark')
+        start = date(2024, 1, 1)
+        for number in range(self.config.tasks):
+            task = self.add('Task', content='Task %d' % number, project=entityLink(project),
+                            task_assignees=[entityLink(user)], sg_versions=[],
+                            due_date=(start + timedelta(days=number % 365)).isoformat(),
+                            updated_at='2024-01-01T00:00:00Z', sg_status_list=STATUSES[number % len(STATUSES)])
+            task['image'] = '%s/thumbnail/%d' % (self.url, task['id'])
+            for versionNumber in range(self.config.versionsPerTask):
+                version = self.add('Version', code='v%03d' % versionNumber, project=entityLink(project),
+                                   sg_task=entityLink(task), published_files=[])
+                task['sg_versions'].append(entityLink(version))
+                for fileNumber in range(self.config.filesPerVersion):
+                    self.addAttachment(version, 'file_%d.bin' % fileNumber, self.config.fileSize)
+
+    def addAttachment(self, version: Dict[str, Any], name: str, size: int) -> Dict[str, Any]:
+        attachment = self.add('Attachment', attachment_links=[entityLink(version)])
+        attachment['this_file'] = {'type': 'Attachment', 'id': attachment['id'], 'name': name,
+                                   'link_type': 'upload', 'content_type': 'application/octet-stream',
+                                   'url': '%s/file/%d' % (self.url, attachment['id'])}
+        attachment['file_size'] = size
+        attachment['updated_at'] = '2024-01-01T00:00:00Z'
+        return attachment
+
+    def start(self) -> 'FakeShotgrid':
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def read(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self.lock:
+            found = [entity for entity in self.entities.get(params['type'], {}).values()
+                     if matches(entity, params['filters'])]
+        for sort in reversed(params.get('sorts') or [{'field_name': 'id', 'direction': 'asc'}]):
+            found.sort(key=sortKey(sort['field_name']), reverse=sort['direction'] == 'desc')
+
+        paging = params['paging']
+        first = (paging['current_page'] - 1) * paging['entities_per_page']
+        page = found[first:first + paging['entities_per_page']]
+        return {
+            'entities': [self.project(entity, params['return_fields']) for entity in page],
+            'paging_info': {'entity_count': len(found),
+                            'has_next_page': first + len(page) < len(found)},
+        }
+
+    def project(self, entity: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+        record = {'type': entity['type'], 'id': entity['id']}
+        for field in fields:
+            record[field] = entity.get(field)
+        return record
+
+    def create(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        fields = {field['field_name']: field['value'] for field in params['fields']}
+        with self.lock:
+            entity = self.add(params['type'], **fields)
+            if params['type'] == 'Version' and fields.get('sg_task') is not None:
+                task = self.entities['Task'].get(fields['sg_task']['id'])
+                if task is not None:
+                    task['sg_versions'].append(entityLink(entity))
+        return self.project(entity, params.get('return_fields') or ['id'])
+
+    def call(self, method: str, params: List[Any]) -> Any:
+        auth = params[0] if len(params) > 0 and isinstance(params[0], dict) else {}
+        if method != 'info' and auth.get('session_token') != SESSION_TOKEN and \
+                (auth.get('user_login') != LOGIN or auth.get('user_password') != PASSWORD):
+            return {'exception': True, 'error_code': 102, 'message': 'Authentication failed'}
+
+        payload = params[1] if len(params) > 1 else None
+        if method == 'info':
+            return {'version': [8, 0, 0], 'full_version': [8, 0, 0, 0],
+                    'user_authentication_method': 'default', 's3_direct_uploads_enabled': True,
+                    's3_enabled_upload_types': {'Version': ['sg_uploaded_movie'], '*': ['this_file']}}
+        if method == 'get_session_token':
+            return {'results': {'session_id': SESSION_TOKEN}}
+        if method == 'read':
+            return {'results': self.read(payload)}
+        if method == 'create':
+            return {'results': [self.create(payload)]}
+        if method == 'batch':
+            results = []
+            for request in payload:
+                if request['request_type'] != 'create':
+                    raise Exception("Unsupported batch request: " + request['request_type'])
+                results.append(self.create(request))
+            return {'results': results}
+        raise Exception("Unsupported method: " + method)
+
+    def upload(self, path: str, form: Dict[str, str]) -> str:
+        if path == '/upload/api_get_upload_link_info':
+            uploadId = 'upload-%d' % next(self.ids)
+            return '1\n%s/storage/%s\n0\n%s\n%s\n' % (self.url, uploadId, form['upload_type'], uploadId)
+        if path == '/upload/api_get_upload_link_for_part':
+            return '1\n%s/storage/%s/%s\n' % (self.url, form['upload_id'], form['part_number'])
+        if path == '/upload/api_complete_multipart_upload':
+            return '1\n'
+        if path == '/upload/api_link_file':
+            uploadId = form['upload_link_info'].split('\n')[4]
+            with self.lock:
+                size = sum(bytes for key, bytes in self.uploads.items()
+                           if key.split('/')[0] == uploadId)
+                entity = self.entities[form['entity_type']][int(form['entity_id'])]
+                attachment = self.addAttachment(entity, form.get('display_name', uploadId), size)
+                entity[form['field_name']] = attachment['this_file']
+            return '1:%d\n' % attachment['id']
+        raise Exception("Unsupported upload endpoint: " + path)
+
+    def throttle(self, size: int, started: float):
+        if self.config.bandwidth:
+            ahead = size / self.config.bandwidth - (time.perf_counter() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def handler(self) -> type:
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format: str, *args: Any):
+                pass
+
+            def reply(self, status: int, body: bytes, contentType: str = 'application/json',
+                      headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                self.send_header('Content-Type', contentType)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def throttled(self) -> bool:
+                time.sleep(site.config.latency)
+                if random.random() >= site.config.throttleRate:
+                    return False
+                self.readBody()
+                self.reply(429, b'', 'text/plain', {'Retry-After': '0'})
+                return True
+
+            def readBody(self) -> bytes:
+                remaining = int(self.headers.get('Content-Length') or 0)
+                started = time.perf_counter()
+                chunks = []
+                received = 0
+                while remaining > 0:
+                    chunk = self.rfile.read(min(WRITE_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    received += len(chunk)
+                    remaining -= len(chunk)
+                    site.throttle(received, started)
+                return b''.join(chunks)
+
+            def do_POST(self):
+                if self.throttled():
+                    return
+                body = self.readBody()
+                path = urllib.parse.urlparse(self.path).path
+                try:
+                    if path.startswith('/upload/'):
+                        form = {key: values[0] for key, values in
+                                urllib.parse.parse_qs(body.decode('utf-8')).items()}
+                        return self.reply(200, site.upload(path, form).encode('utf-8'), 'text/plain')
+
+                    request = json.loads(body)
+                    response = site.call(request['method_name'], request['params'])
+                except Exception as e:
+                    response = {'exception': True, 'message': str(e)}
+                self.reply(200, json.dumps(response).encode('utf-8'))
+
+            def do_PUT(self):
+                if self.throttled():
+                    return
+                body = self.readBody()
+                key = urllib.parse.urlparse(self.path).path[len('/storage/'):]
+                with site.lock:
+                    site.uploads[key] = len(body)
+                self.reply(200, b'', 'text/plain', {'ETag': '"%s"' % key})
+
+            def do_GET(self):
+                if self.throttled():
+                    return
+                if self.path.startswith('/thumbnail/'):
+                    return self.reply(200, thumbnailPng(int(self.path.rsplit('/', 1)[-1])), 'image/png')
+                attachment = site.entities['Attachment'].get(int(self.path.rsplit('/', 1)[-1]))
+                if attachment is None:
+                    return self.reply(404, b'', 'text/plain')
+
+                size = attachment['file_size']
+                etag = '"%d-%s"' % (attachment['id'], attachment.get('updated_at'))
+                offset = 0
+                match = (self.headers.get('Range') or '').replace('bytes=', '').split('-')[0]
+                if self.headers.get('If-Range') not in (None, etag):
+                    match = ''
+                if match:
+                    offset = int(match)
+                    if offset >= size:
+                        return self.reply(416, b'', 'text/plain', {'Content-Range': 'bytes */%d' % size})
+
+                self.send_response(206 if match else 200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(size - offset))
+                self.send_header('ETag', etag)
+                if match:
+                    self.send_header('Content-Range', 'bytes %d-%d/%d' % (offset, size - 1, size))
+                self.end_headers()
+
+                started = time.perf_counter()
+                sent = 0
+                while offset + sent < size:
+                    start = (offset + sent) % max(1, len(site.payload))
+                    chunk = site.payload[start:start + min(WRITE_CHUNK, size - offset - sent)]
+                    if not chunk:
+                        chunk = bytes(min(WRITE_CHUNK, size - offset - sent))
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+                    site.throttle(sent, started)
+
+        return Handler
@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List
+
+from benchmarks.fakeshotgrid import LOGIN, PASSWORD, FakeShotgrid, ServerConfig
+from src.client import ShotgridClient
+from src.entities import Task
+from src.transfer import failures
+
+TASK_COUNTS = [10, 100, 1000, 10000]
+REPEAT = 3
+UPLOAD_FILES = 4
+# Typing "task 42" one key at a time, then a due date range, status and a re-sort.
+SEARCH_QUERIES = [dict(text="task 42"[:length]) for length in range(1, 8)] + [
+    dict(dueFrom='2024-03-01', dueTo='2024-06-30'), dict(status='ip', text='task 1')]
+
+
+def measure(repeat: int, run: Callable[[], Any]) -> Dict[str, Any]:
+    seconds: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - started)
+    return {'seconds': seconds, 'best': min(seconds), 'median': statistics.median(seconds)}
+
+
+def login(site: FakeShotgrid) -> ShotgridClient:
+    client = ShotgridClient()
+    client.login(site.url, LOGIN, PASSWORD)
+    return client
+
+
+def transfer(runnable: Any):
+    # Runs a transfer QRunnable on this thread; a benchmark of failed
+    # transfers would be meaningless, so any failure aborts the run.
+    outcome: Dict[str, Any] = {}
+    runnable.signals.result.connect(lambda result: outcome.setdefault('result', result))
+    runnable.signals.error.connect(lambda error: outcome.setdefault('error', error))
+    runnable.run()
+    if 'error' in outcome:
+        raise Exception(str(outcome['error']))
+    for failure in failures(outcome['result']):
+        raise Exception(failure.path + ": " + str(failure.error))
+
+
+def benchmarkTasks(config: ServerConfig, repeat: int, gui: bool) -> List[Dict[str, Any]]:
+    site = FakeShotgrid(config).start()
+    try:
+        client = login(site)
+        results = [dict(measure(repeat, client.getAllTasks), name='getAllTasks', tasks=config.tasks)]
+        if gui:
+            results.append(dict(measure(repeat, lambda: populateWidget(client.getAllTasks())),
+                                name='TasksWidget', tasks=config.tasks))
+            tasks = client.getAllTasks()
+            results.append(dict(measure(repeat, lambda: searchTasks(tasks)),
+                                name='TaskIndex', tasks=config.tasks, queries=len(SEARCH_QUERIES)))
+        client.logout()
+        return results
+    finally:
+        site.stop()
+
+
+def populateWidget(rows: List[Task]):
+    # Same slicing as TasksPage.showTasks, measured until the rows are painted.
+    from PySide6 import QtWidgets
+    from src.tasks import ROWS_PER_TICK, TasksWidget
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    widget = TasksWidget()
+    widget.resize(840, 620)
+    widget.show()
+    for start in range(0, len(rows), ROWS_PER_TICK):
+        widget.addTasks(rows[start:start + ROWS_PER_TICK])
+        app.processEvents()
+    widget.viewport().repaint()
+    widget.close()
+    widget.deleteLater()
+    app.processEvents()
+
+
+def searchTasks(tasks: List[Task]):
+    # Index construction is included, every query is answered from memory.
+    from src.taskindex import TaskIndex, TaskQuery
+
+    taskIndex = TaskIndex()
+    taskIndex.add(tasks)
+    for query in SEARCH_QUERIES:
+        taskIndex.search(TaskQuery(**query))
+    taskIndex.search(TaskQuery(), 'name')
+
+
+def benchmarkTransfers(config: ServerConfig, repeat: int) -> List[Dict[str, Any]]:
+    from src.shotgun import DownloadAllFiles, UploadFiles
+
+    site = FakeShotgrid(config).start()
+    try:
+        client = login(site)
+        task = client.getAllTasks()[0]
+        files = config.versionsPerTask * config.filesPerVersion
+
+        with tempfile.TemporaryDirectory() as outDir:
+            def download():
+                shutil.rmtree(os.path.join(outDir, 'tasks'), ignore_errors=True)
+                transfer(DownloadAllFiles(client, task.id, task.name, outDir))
+
+            downloads = dict(measure(repeat, download), name='DownloadAllFiles',
+                             files=files, bytes=files * config.fileSize)
+
+        with tempfile.TemporaryDirectory() as inDir:
+            paths = []
+            for number in range(UPLOAD_FILES):
+                path = os.path.join(inDir, 'upload_%d.bin' % number)
+                with open(path, 'wb') as file:
+                    file.write(os.urandom(config.fileSize))
+                paths.append(path)
+
+            uploads = dict(measure(repeat, lambda: transfer(UploadFiles(client, task.id, paths))),
+                           name='UploadFiles', files=len(paths), bytes=len(paths) * config.fileSize)
+
+        client.logout()
+        for result in (downloads, uploads):
+            result['megabytesPerSecond'] = result['bytes'] / result['best'] / 1e6
+        return [downloads, uploads]
+    finally:
+        site.stop()
+
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Time task loading and transfers against a local fake Shotgrid site")
+    parser.add_argument('--tasks', type=int, nargs='+', default=TASK_COUNTS,
+                        help="Task counts to load")
+    parser.add_argument('--versions', type=int, default=2, help="Versions per task")
+    parser.add_argument('--files', type=int, default=1, help="Files per version")
+    parser.add_argument('--file-size', type=int, default=1024 * 1024, help="Bytes per file")
+    parser.add_argument('--latency', type=float, default=0.0, help="Milliseconds added to every request")
+    parser.add_argument('--bandwidth', type=float, help="Megabytes per second per connection")
+    parser.add_argument('--throttle', type=float, default=0.0,
+                        help="Share of requests (0-1) the server answers with 429")
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="Runs per measurement")
+    parser.add_argument('--no-gui', action='store_true', help="Skip the TasksWidget measurement")
+    parser.add_argument('--out', default='benchmark.json', help="Where to write the JSON results")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str]) -> int:
+    arguments = parseArguments(argv)
+
+    def config(tasks: int) -> ServerConfig:
+        return ServerConfig(tasks=tasks, versionsPerTask=arguments.versions,
+                            filesPerVersion=arguments.files, fileSize=arguments.file_size,
+                            latency=arguments.latency / 1000,
+                            bandwidth=arguments.bandwidth * 1e6 if arguments.bandwidth else None,
+                            throttleRate=arguments.throttle)
+
+    results: List[Dict[str, Any]] = []
+    for tasks in arguments.tasks:
+        results.extend(benchmarkTasks(config(tasks), arguments.repeat, not arguments.no_gui))
+    results.extend(benchmarkTransfers(config(1), arguments.repeat))
+
+    server = asdict(config(0))
+    del server['tasks']
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'server': server,
+        'results': results,
+    }
+    with open(arguments.out, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    for result in results:
+        print("%-18s %8s  best %.4fs  median %.4fs" % (
+            result['name'], result.get('tasks', result.get('files')), result['best'], result['median']))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,151 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+from src.blobcache import BlobCache
+from src.cache import TaskCache
+from src.client import (DOWNLOAD_WORKERS, UPLOAD_WORKERS, ShotgridClient, downloadTaskFiles, mirrorTaskFiles,
+                        uploadTaskFiles)
+from src.credentials import Credentials, loadConfig
+from src.entities import Task, decodeTask
+from src.metrics import metrics
+from src.transfer import TransferResult
+
+TASK_WORKERS = 2
+
+
+def parseArguments(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Download / upload Shotgrid task files without the GUI. "
+                    "Prints a JSON summary and exits non-zero if anything failed.")
+    parser.add_argument('--url', help="Shotgrid site url (defaults to .config.json / SHOTGRID_URL)")
+    parser.add_argument('--username', help="Login (defaults to .config.json / SHOTGRID_USERNAME)")
+    parser.add_argument('--password', help="Password (defaults to .config.json / SHOTGRID_PASSWORD)")
+    parser.add_argument('--tasks-parallel', type=int, default=TASK_WORKERS,
+                        help="How many tasks to transfer at the same time")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="Record API metrics and write them to FILE (.prom for Prometheus text, JSON otherwise)")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    download = commands.add_parser('download', help="Download every version file of tasks")
+    selection = download.add_mutually_exclusive_group(required=True)
+    selection.add_argument('--task', type=int, action='append', dest='tasks',
+                           help="Task id, may be repeated")
+    selection.add_argument('--query', help="Assigned tasks whose name contains this text")
+    selection.add_argument('--all', action='store_true', help="Every assigned task")
+    download.add_argument('--out', default=os.getcwd(), help="Output directory")
+    download.add_argument('--workers', type=int, default=DOWNLOAD_WORKERS,
+                          help="Concurrent files per task")
+    download.add_argument('--mirror', action='store_true',
+                          help="Only download attachments that are new or changed since the last --mirror run")
+    download.add_argument('--prune', action='store_true',
+                          help="With --mirror, delete local files whose attachment is gone from Shotgrid")
+
+    upload = commands.add_parser('upload', help="Publish files as new versions of a task")
+    upload.add_argument('--task', type=int, required=True, help="Task id")
+    upload.add_argument('files', nargs='+', help="Files to upload, one version each")
+    upload.add_argument('--workers', type=int, default=UPLOAD_WORKERS,
+                        help="Concurrent uploads")
+
+    return parser.parse_args(argv)
+
+
+def getCredentials(arguments: argparse.Namespace) -> Credentials:
+    config = loadConfig()
+
+    def pick(name: str) -> Optional[str]:
+        value = getattr(arguments, name) or os.environ.get('SHOTGRID_' + name.upper())
+        if value is None and config is not None:
+            value = getattr(config, name)
+        return value
+
+    url, username, password = pick('url'), pick('username'), pick('password')
+    sessionToken = None
+    if config is not None and config.url == url and config.username == username:
+        sessionToken = config.sessionToken
+
+    if url is None or username is None or (password is None and sessionToken is None):
+        raise Exception("Missing credentials: pass --url, --username and --password or log in with the GUI once")
+
+    return Credentials(url=url, username=username, password=password or '', sessionToken=sessionToken)
+
+
+def summarize(results: List[TransferResult]) -> List[Dict[str, Any]]:
+    return [dict(asdict(result), ok=result.ok) for result in results]
+
+
+def runTask(client: ShotgridClient, work: Any, task: Task) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {'id': task.id, 'name': task.name or None, 'error': None, 'files': []}
+    try:
+        summary['files'] = summarize(work(client, task))
+    except Exception as e:
+        summary['error'] = str(e)
+    finally:
+        client.release()
+
+    summary['ok'] = summary['error'] is None and all(file['ok'] for file in summary['files'])
+    return summary
+
+
+def selectTasks(client: ShotgridClient, arguments: argparse.Namespace) -> List[Task]:
+    if arguments.tasks is not None:
+        return client.getTasksById(arguments.tasks)
+    if arguments.query is not None:
+        return client.findTasks(arguments.query)
+    return client.getAllTasks()
+
+
+def main(argv: List[str]) -> int:
+    arguments = parseArguments(argv)
+    credentials = getCredentials(arguments)
+    if arguments.metrics is not None:
+        metrics.enabled = True
+
+    client = ShotgridClient()
+    client.cache = TaskCache()
+    client.blobs = BlobCache.fromEnvironment()
+    client.login(credentials.url, credentials.username, credentials.password, credentials.sessionToken)
+
+    if arguments.command == 'download':
+        tasks = selectTasks(client, arguments)
+
+        def work(worker: ShotgridClient, task: Task) -> List[TransferResult]:
+            if arguments.mirror or arguments.prune:
+                return mirrorTaskFiles(worker, task.id, task.name, arguments.out, arguments.workers,
+                                       prune=arguments.prune)
+            return downloadTaskFiles(worker, task.id, task.name, arguments.out, arguments.workers)
+    else:
+        tasks = [decodeTask({'type': 'Task', 'id': arguments.task})]
+
+        def work(worker: ShotgridClient, task: Task) -> List[TransferResult]:
+            return uploadTaskFiles(worker, task.id, arguments.files, arguments.workers)
+
+    with ThreadPoolExecutor(max_workers=max(1, arguments.tasks_parallel)) as executor:
+        summaries = list(executor.map(lambda task: runTask(client, work, task), tasks))
+    client.logout()
+    if arguments.metrics is not None:
+        metrics.export(arguments.metrics)
+
+    if arguments.command == 'download' and arguments.tasks is not None:
+        found = set(task.id for task in tasks)
+        summaries.extend({'id': id, 'name': None, 'error': "Task not found", 'files': [], 'ok': False}
+                         for id in arguments.tasks if id not in found)
+
+    ok = all(summary['ok'] for summary in summaries)
+    json.dump({'command': arguments.command, 'ok': ok, 'tasks': summaries}, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main(sys.argv[1:]))
+    except Exception as e:
+        json.dump({'ok': False, 'error': str(e)}, sys.stdout)
+        sys.stdout.write('\n')
+        sys.exit(2)
@@ -1,16 +1,22 @@
+import time
+LAUNCHED = time.perf_counter()
+
 from dataclasses import asdict
+import os
 import sys
 import json
 from typing import Optional
-from PySide6 import QtCore, QtWidgets
-from src.credentials import Credentials, NullableCredentials
+from PySide6 import QtCore, QtGui, QtWidgets
+from src.credentials import CONFIG_FILE, Credentials, NullableCredentials, loadConfig
+from src.diagnostics import DiagnosticsPanel
+from src.metrics import metrics
 
 from src.login import LoginForm
 from src.tasks import TasksPage
 from src.toast import Toast
 from src.url import ShotgridUrl
 
-CONFIG_FILE = ".config.json"
+PROFILE_STARTUP = 'SHOTGRID_PROFILE_STARTUP'
 
 
 class Window(QtWidgets.QMainWindow):
@@ -18,9 +24,13 @@ class Window(QtWidgets.QMainWindow):
     login: LoginForm
     tasksWidget: TasksPage
     frames: QtWidgets.QStackedLayout
+    saved: Optional[NullableCredentials]
+    diagnostics: Optional[DiagnosticsPanel] = None
+    painted: bool = False
 
     def __init__(self, credentials: Optional[NullableCredentials]):
         super(Window, self).__init__()
+        self.saved = credentials
         self.createWidgets(credentials)
 
         if credentials is None or credentials.url is None:
@@ -28,7 +38,7 @@ class Window(QtWidgets.QMainWindow):
 
         self.advance()
 
-        if credentials.password is None or credentials.username is None:
+        if credentials.username is None or (credentials.password is None and credentials.sessionToken is None):
             return
 
         self.loginUser()
@@ -54,19 +64,45 @@ class Window(QtWidgets.QMainWindow):
         holder.setLayout(self.frames)
         self.setCentralWidget(holder)
 
+        diagnosticsShortcut = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+Shift+D"), self)
+        diagnosticsShortcut.activated.connect(self.showDiagnostics)
+
+    @QtCore.Slot()
+    def showDiagnostics(self):
+        if self.diagnostics is None:
+            self.diagnostics = DiagnosticsPanel(metrics)
+        self.diagnostics.show()
+        self.diagnostics.raise_()
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        super(Window, self).paintEvent(event)
+        if self.painted:
+            return
+
+        self.painted = True
+        if os.environ.get(PROFILE_STARTUP):
+            print("First paint after %.0f ms" % ((time.perf_counter() - LAUNCHED) * 1000), file=sys.stderr)
+
     def getCredentials(self):
-        return Credentials(
+        credentials = Credentials(
             url=self.shotgridUrlForm.url.text(),
             username=self.login.username.text(),
             password=self.login.password.text()
         )
+        # A saved token only stands in for the password of the account it was issued to.
+        if self.saved is not None and self.saved.url == credentials.url and \
+                self.saved.username == credentials.username:
+            credentials.sessionToken = self.saved.sessionToken
+        return credentials
 
     def saveCredentials(self):
+        credentials = self.getCredentials()
+        credentials.sessionToken = self.tasks.client.sessionToken
+        self.saved = NullableCredentials(**asdict(credentials))
         with open(CONFIG_FILE, 'w') as file:
             file.write(
                 json.dumps(
-                    asdict(
-                        self.getCredentials())))
+                    asdict(credentials)))
 
     @QtCore.Slot()
     def loginUser(self):
@@ -100,26 +136,6 @@ class Window(QtWidgets.QMainWindow):
         self.frames.setCurrentIndex(index - 1)
 
 
-def loadConfig():
-    open(CONFIG_FILE, 'a')   # Hack to create file if it doesn't exist
-    with open(CONFIG_FILE, 'r') as file:
-        userConfigFile = file.read()
-
-    if len(userConfigFile) <= 2:
-        return None
-
-    try:
-        userConfigJson = json.loads(userConfigFile)
-    except:
-        return None
-
-    url = userConfigJson.get('url')
-    username = userConfigJson.get('username')
-    password = userConfigJson.get('password')
-
-    return NullableCredentials(url, username, password)
-
-
 if __name__ == "__main__":
     config = loadConfig()
     app = QtWidgets.QApplication([])
@@ -0,0 +1,114 @@
+import time
+from contextlib import contextmanager
+from threading import Condition, local
+from typing import Any, Callable, Iterator, List, Optional, Sequence
+
+BURST_SECONDS = 0.25
+MIN_BURST = 16 * 1024
+
+current = local()
+
+
+class TokenBucket:
+    # Limits the bytes per second of everything that consumes from it; a
+    # `rate` of None means unlimited. Consumers take their tokens up front and
+    # then wait out any deficit, so a bucket shared by several threads holds
+    # them to the rate together. `setRate` applies immediately, also to
+    # threads that are already waiting.
+    rate: Optional[float]
+    tokens: float
+    condition: Condition
+
+    def __init__(self, rate: Optional[float] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        self.clock = clock
+        self.rate = rate if rate is not None and rate > 0 else None
+        self.tokens = self.burst
+        self.updated = clock()
+        self.condition = Condition()
+
+    @property
+    def burst(self) -> float:
+        return max(MIN_BURST, (self.rate or 0) * BURST_SECONDS)
+
+    def refill(self):
+        now = self.clock()
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def setRate(self, rate: Optional[float]):
+        with self.condition:
+            self.refill()
+            self.rate = rate if rate is not None and rate > 0 else None
+            self.tokens = min(self.tokens, self.burst)
+            self.condition.notify_all()
+
+    def consume(self, count: int):
+        with self.condition:
+            if self.rate is None:
+                return
+
+            self.refill()
+            self.tokens -= count
+            while self.rate is not None and self.tokens < 0:
+                self.condition.wait(-self.tokens / self.rate)
+                self.refill()
+            if self.rate is None:
+                self.tokens = max(self.tokens, 0)
+
+
+def consume(buckets: Sequence[TokenBucket], count: int):
+    for bucket in buckets:
+        bucket.consume(count)
+
+
+def chunkSize(buckets: Sequence[TokenBucket], default: int) -> int:
+    # Reads are kept to one burst of the tightest limit so waits stay short
+    # and a pause or cancel is noticed quickly.
+    limits = [int(bucket.burst) for bucket in buckets if bucket.rate is not None]
+    return min([default] + limits)
+
+
+class ThrottledReader:
+    # File-like wrapper that charges every read to `buckets`.
+    def __init__(self, file: Any, buckets: Sequence[TokenBucket]) -> None:
+        self.file = file
+        self.buckets = buckets
+
+    def read(self, size: int = -1) -> bytes:
+        limit = chunkSize(self.buckets, size if size is not None and size > 0 else MIN_BURST)
+        data = self.file.read(limit)
+        consume(self.buckets, len(data))
+        return data
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.file, name)
+
+
+@contextmanager
+def limited(buckets: Sequence[TokenBucket]) -> Iterator[None]:
+    # Uploads go through shotgun_api3, so the buckets of the transfer running
+    # on this thread are handed to the storage upload wrapper this way.
+    previous = getattr(current, 'buckets', [])
+    current.buckets = list(buckets)
+    try:
+        yield
+    finally:
+        current.buckets = previous
+
+
+def currentBuckets() -> List[TokenBucket]:
+    return getattr(current, 'buckets', [])
+
+
+def throttleUploads(sg: Any) -> Any:
+    uploadData = sg._upload_data_to_storage
+
+    def throttledUploadData(data: Any, contentType: str, size: int, url: str) -> Any:
+        buckets = currentBuckets()
+        if len(buckets) > 0:
+            data = ThrottledReader(data, buckets)
+        return uploadData(data, contentType, size, url)
+
+    sg._upload_data_to_storage = throttledUploadData
+    return sg
@@ -0,0 +1,156 @@
+import os
+import shutil
+import sqlite3
+import stat
+import time
+import uuid
+from contextlib import closing
+from threading import Lock
+from typing import Optional
+
+from src.verify import fileHash
+
+BLOB_CACHE_ENV = 'SHOTGRID_BLOB_CACHE'
+BLOB_CACHE_LIMIT_ENV = 'SHOTGRID_BLOB_CACHE_LIMIT'
+BLOB_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'shotgrid', 'blobs')
+BLOB_CACHE_LIMIT = 20 * 1024 ** 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    site TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    updated TEXT,
+    PRIMARY KEY (site, id)
+);
+CREATE INDEX IF NOT EXISTS blobs_used ON blobs (used);
+"""
+
+
+class BlobCache:
+    # Attachment bodies stored once by content hash under `root`, shared by
+    # every site, account and process that points at the same directory.
+    # An index maps (site, attachment id) to a hash, so a repeat download is
+    # served locally and identical files uploaded as different attachments
+    # are only kept once. Least recently used blobs are evicted beyond
+    # `limit` bytes. Blobs are read-only since they are hardlinked into
+    # download folders where possible.
+    root: str
+    limit: int
+    lock: Lock
+
+    def __init__(self, root: str = BLOB_CACHE_DIR, limit: int = BLOB_CACHE_LIMIT) -> None:
+        self.root = root
+        self.limit = limit
+        self.lock = Lock()
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        with self.lock, closing(self.connect()) as db:
+            db.executescript(SCHEMA)
+
+    @staticmethod
+    def fromEnvironment() -> Optional['BlobCache']:
+        # SHOTGRID_BLOB_CACHE picks the directory, or turns the cache off
+        # when set to an empty string.
+        root = os.environ.get(BLOB_CACHE_ENV, BLOB_CACHE_DIR)
+        if root == '':
+            return None
+        limit = os.environ.get(BLOB_CACHE_LIMIT_ENV)
+        return BlobCache(root, int(limit) if limit else BLOB_CACHE_LIMIT)
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(os.path.join(self.root, 'index.sqlite'), timeout=30)
+
+    def blobPath(self, hash: str) -> str:
+        return os.path.join(self.root, 'objects', hash[:2], hash[2:])
+
+    def lookup(self, site: str, id: int, size: Optional[int] = None, updated: Optional[str] = None) -> Optional[str]:
+        # `updated` is the attachment's modification time, so a file replaced
+        # under the same attachment id is not served from the old blob.
+        with self.lock, closing(self.connect()) as db, db:
+            row = db.execute("SELECT blobs.hash, blobs.size, attachments.updated FROM attachments "
+                             "JOIN blobs ON blobs.hash = attachments.hash "
+                             "WHERE attachments.site = ? AND attachments.id = ?", (site, id)).fetchone()
+            if row is None:
+                return None
+
+            hash, blobSize, blobUpdated = row
+            path = self.blobPath(hash)
+            if (size is not None and size != blobSize) or blobUpdated != updated or not os.path.isfile(path):
+                db.execute("DELETE FROM attachments WHERE site = ? AND id = ?", (site, id))
+                return None
+
+            db.execute("UPDATE blobs SET used = ? WHERE hash = ?", (time.time(), hash))
+            return hash
+
+    def materialize(self, hash: str, location: str):
+        blob = self.blobPath(hash)
+        if os.path.exists(location) and os.path.samefile(blob, location):
+            return
+
+        temporary = location + '.' + uuid.uuid4().hex
+        try:
+            os.link(blob, temporary)
+        except OSError:
+            shutil.copyfile(blob, temporary)
+        os.replace(temporary, location)
+
+    def store(self, site: str, id: int, path: str, updated: Optional[str] = None, hash: Optional[str] = None) -> str:
+        hash = hash if hash is not None else fileHash(path)
+        blob = self.blobPath(hash)
+        if not os.path.isfile(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            temporary = blob + '.' + uuid.uuid4().hex
+            try:
+                os.link(path, temporary)
+            except OSError:
+                shutil.copyfile(path, temporary)
+            os.chmod(temporary, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.replace(temporary, blob)
+
+        with self.lock, closing(self.connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO blobs (hash, size, used) VALUES (?, ?, ?)",
+                       (hash, os.path.getsize(blob), time.time()))
+            db.execute("INSERT OR REPLACE INTO attachments (site, id, hash, updated) VALUES (?, ?, ?, ?)",
+                       (site, id, hash, updated))
+        self.evict()
+        return hash
+
+    def remove(self, hash: str):
+        with self.lock, closing(self.connect()) as db, db:
+            db.execute("DELETE FROM blobs WHERE hash = ?", (hash,))
+            db.execute("DELETE FROM attachments WHERE hash = ?", (hash,))
+        try:
+            os.remove(self.blobPath(hash))
+        except OSError:
+            pass
+
+    def size(self) -> int:
+        with self.lock, closing(self.connect()) as db:
+            return db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self):
+        with self.lock, closing(self.connect()) as db, db:
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.limit:
+                return
+
+            evicted = []
+            for hash, size in db.execute("SELECT hash, size FROM blobs ORDER BY used"):
+                if total <= self.limit:
+                    break
+                evicted.append(hash)
+                total -= size
+
+            db.executemany("DELETE FROM blobs WHERE hash = ?", [(hash,) for hash in evicted])
+            db.executemany("DELETE FROM attachments WHERE hash = ?", [(hash,) for hash in evicted])
+
+        for hash in evicted:
+            try:
+                os.remove(self.blobPath(hash))
+            except OSError:
+                pass
@@ -0,0 +1,165 @@
+import json
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from threading import Lock
+from typing import Any, List, Optional, Tuple
+
+from src.entities import (Attachment, EntityLink, Task, Version, decodeAttachment, decodeTask, encodeAttachment,
+                          encodeTask)
+
+CACHE_FILE = ".cache.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    due_date TEXT,
+    updated_at TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (account, id)
+);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    task_id INTEGER NOT NULL,
+    name TEXT,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (account, id)
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    id INTEGER NOT NULL,
+    account TEXT NOT NULL,
+    version_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (account, version_id, id)
+);
+CREATE TABLE IF NOT EXISTS sync (
+    account TEXT PRIMARY KEY,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cursors (
+    account TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value INTEGER NOT NULL,
+    PRIMARY KEY (account, name)
+);
+"""
+
+
+def accountKey(url: str, username: str) -> str:
+    return url.rstrip('/') + ' ' + username
+
+
+def toJson(entity: Any) -> str:
+    return json.dumps(entity, default=str)
+
+
+class TaskCache:
+    # Every call opens its own short-lived connection so the cache can be used
+    # from the GUI thread and from QThreadPool workers alike.
+    path: str
+    lock: Lock
+
+    def __init__(self, path: str = CACHE_FILE) -> None:
+        self.path = path
+        self.lock = Lock()
+        with self.lock, closing(self.connect()) as db:
+            # Plans used to be stored without an account; they are only a
+            # cache, so older tables are dropped rather than migrated.
+            columns = [row[1] for row in db.execute("PRAGMA table_info(versions)")]
+            if len(columns) > 0 and 'account' not in columns:
+                db.executescript("DROP TABLE versions; DROP TABLE attachments;")
+            db.executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def loadTasks(self, account: str) -> List[Task]:
+        with self.lock, closing(self.connect()) as db:
+            rows = db.execute(
+                "SELECT data FROM tasks WHERE account = ? ORDER BY due_date IS NOT NULL, due_date, id", (account,)).fetchall()
+
+        return [decodeTask(json.loads(data)) for data, in rows]
+
+    def lastSync(self, account: str) -> Optional[datetime]:
+        with self.lock, closing(self.connect()) as db:
+            row = db.execute(
+                "SELECT updated_at FROM sync WHERE account = ?", (account,)).fetchone()
+
+        return datetime.fromisoformat(row[0]) if row is not None else None
+
+    def saveTasks(self, account: str, tasks: List[Task]):
+        rows = [(task.id, account, task.dueDate,
+                 str(task.updatedAt) if task.updatedAt is not None else None, toJson(encodeTask(task)))
+                for task in tasks]
+
+        with self.lock, closing(self.connect()) as db, db:
+            db.executemany(
+                "INSERT OR REPLACE INTO tasks (id, account, due_date, updated_at, data) VALUES (?, ?, ?, ?, ?)", rows)
+
+    def markSynced(self, account: str, tasks: List[Task]):
+        # The sync cursor is the newest server-side `updated_at` seen, so the
+        # local clock never has to agree with the server's. Only call this once
+        # every page of a refresh has been saved.
+        latest = self.lastSync(account)
+        for task in tasks:
+            updatedAt = task.updatedAt
+            if updatedAt is not None and (latest is None or updatedAt > latest):
+                latest = updatedAt
+
+        if latest is None:
+            return
+
+        with self.lock, closing(self.connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO sync (account, updated_at) VALUES (?, ?)",
+                       (account, latest.isoformat()))
+
+    def removeTasks(self, account: str, ids: List[int]):
+        with self.lock, closing(self.connect()) as db, db:
+            db.executemany("DELETE FROM tasks WHERE account = ? AND id = ?",
+                           [(account, id) for id in ids])
+
+    def getCursor(self, account: str, name: str) -> Optional[int]:
+        with self.lock, closing(self.connect()) as db:
+            row = db.execute(
+                "SELECT value FROM cursors WHERE account = ? AND name = ?", (account, name)).fetchone()
+
+        return row[0] if row is not None else None
+
+    def setCursor(self, account: str, name: str, value: int):
+        with self.lock, closing(self.connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO cursors (account, name, value) VALUES (?, ?, ?)",
+                       (account, name, value))
+
+    def savePlan(self, account: str, taskId: int, versions: List[Version], plan: List[Tuple[int, Attachment]]):
+        # `plan` pairs a version id with one of its attachments.
+        with self.lock, closing(self.connect()) as db, db:
+            oldVersions = [id for id, in db.execute(
+                "SELECT id FROM versions WHERE account = ? AND task_id = ?", (account, taskId))]
+            db.executemany("DELETE FROM attachments WHERE account = ? AND version_id = ?",
+                           [(account, id) for id in oldVersions])
+            db.execute("DELETE FROM versions WHERE account = ? AND task_id = ?", (account, taskId))
+
+            db.executemany("INSERT OR REPLACE INTO versions (id, account, task_id, name, position) VALUES (?, ?, ?, ?, ?)",
+                           [(version.id, account, taskId, version.name, position)
+                            for position, version in enumerate(versions)])
+            db.executemany("INSERT OR REPLACE INTO attachments (id, account, version_id, data) VALUES (?, ?, ?, ?)",
+                           [(attachment.id, account, versionId, toJson(encodeAttachment(attachment)))
+                            for versionId, attachment in plan])
+
+    def loadPlan(self, account: str, taskId: int) -> Optional[List[Tuple[Version, Attachment]]]:
+        # None when the task's plan was never saved, as opposed to a task
+        # whose versions have no attachments.
+        with self.lock, closing(self.connect()) as db:
+            if db.execute("SELECT 1 FROM versions WHERE account = ? AND task_id = ?",
+                          (account, taskId)).fetchone() is None:
+                return None
+            rows = db.execute(
+                "SELECT versions.id, versions.name, attachments.data FROM versions "
+                "JOIN attachments ON attachments.account = versions.account AND attachments.version_id = versions.id "
+                "WHERE versions.account = ? AND versions.task_id = ? "
+                "ORDER BY versions.position, attachments.id", (account, taskId)).fetchall()
+
+        task = EntityLink('Task', taskId, None)
+        return [(Version(id, name, task), decodeAttachment(json.loads(data))) for id, name, data in rows]
@@ -0,0 +1,578 @@
+import os
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import mkdir
+
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Any, Tuple
+
+from src.bandwidth import TokenBucket, limited, throttleUploads
+from src.blobcache import BlobCache
+from src.cache import TaskCache, accountKey
+from src.download import buildRequest, streamDownload
+from src.entities import (Attachment, EntityLink, HumanUser, Task, Version, decodeAttachment, decodeLink,
+                          decodeTask, decodeUser, decodeVersion)
+from src.entitycache import EntityCache
+from src.metrics import metrics, traceConnection, traceMethods
+from src.mirror import loadManifest, manifestEntry, planMirror, pruneFiles, saveManifest
+from src.pool import ConnectionPool
+from src.transfer import TransferControl, TransferResult, runConcurrently
+from src.transport import AimdLimiter, guardConnection, isRejected, isTransient
+from src.upload import enableParallelMultipart
+from src.verify import VERIFY_WORKERS, verifyFile
+
+if TYPE_CHECKING:
+    import shotgun_api3  # type: ignore
+
+DOWNLOAD_WORKERS = 4
+UPLOAD_WORKERS = 4
+ATTACHMENT_QUERY_BATCH = 500
+TASK_PAGE_SIZE = 200
+TASK_FIELDS = ['content', 'due_date', 'updated_at', 'image', 'project', 'sg_status_list']
+
+
+def shotgunApi() -> Any:
+    # Imported on first use so that starting the app (or the CLI) does not pay
+    # for loading shotgun_api3 and its vendored dependencies up front.
+    import shotgun_api3  # type: ignore
+    return shotgun_api3
+
+
+@traceMethods
+class ShotgridClient:
+    # A Shotgun instance must not be shared between threads, so `sg` is the
+    # calling thread's own connection from `pool`. Threads hand it back with
+    # `release()` once they are done.
+    url: Optional[str] = None
+    username: Optional[str] = None
+    sessionToken: Optional[str] = None
+    auth: Dict[str, str]
+    pool: Optional[ConnectionPool] = None
+    cache: Optional[TaskCache] = None
+    blobs: Optional[BlobCache] = None
+    entities: EntityCache
+    limiter: AimdLimiter
+    downloadLimit: TokenBucket
+    uploadLimit: TokenBucket
+    verifier: ThreadPoolExecutor
+
+    def __init__(self, entities: Optional[EntityCache] = None) -> None:
+        self.entities = entities if entities is not None else EntityCache()
+        metrics.entityCache = self.entities.stats
+        self.auth = {}
+        self.limiter = AimdLimiter()
+        self.downloadLimit = TokenBucket()
+        self.uploadLimit = TokenBucket()
+        self.verifier = ThreadPoolExecutor(max_workers=VERIFY_WORKERS, thread_name_prefix='verify')
+
+    @property
+    def sg(self) -> Optional['shotgun_api3.Shotgun']:
+        return self.pool.connection() if self.pool is not None else None
+
+    def release(self):
+        if self.pool is not None:
+            self.pool.release()
+
+    def logout(self):
+        if self.pool is None:
+            raise Exception("User is not logged in")
+
+        self.pool.close()
+        self.pool = None
+
+    def newConnection(self) -> Any:
+        # Not connected yet, so the first RPC (info) already goes through
+        # guardConnection and is retried when throttled.
+        sg = shotgunApi().Shotgun(self.url, connect=False, **self.auth)
+        enableParallelMultipart(sg)
+        return guardConnection(traceConnection(throttleUploads(sg)), self.limiter)
+
+    def open(self, **auth: str):
+        if self.pool is not None:
+            self.pool.close()
+        self.auth = auth
+        self.pool = ConnectionPool(self.newConnection)
+
+    def login(self, url: str, login: str, password: str, sessionToken: Optional[str] = None):
+        self.entities.clear()
+        self.url = url
+        self.username = login
+
+        if sessionToken is not None:
+            try:
+                self.open(session_token=sessionToken)
+                self.getUser()
+                self.sessionToken = sessionToken
+                return
+            except shotgunApi().AuthenticationFault:
+                self.entities.clear()
+
+        self.open(login=login, password=password)
+        self.sessionToken = self.sg.get_session_token()  # type: ignore
+        # Further connections join this session instead of logging in again.
+        self.auth = {'session_token': str(self.sessionToken)}
+
+    def account(self) -> str:
+        return accountKey(str(self.url), str(self.username))
+
+    def getUser(self) -> HumanUser:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        def loadUser() -> Optional[HumanUser]:
+            user = self.sg.find_one(  # type: ignore
+                'HumanUser', [['login', 'contains', self.username]], fields=['login', 'name'])
+            return decodeUser(user) if user is not None else None  # type: ignore
+
+        user = self.entities.fetch(('HumanUser', self.username), loadUser)
+        if user is None:
+            raise Exception(
+                'Could not find a HumanUser with the login: ' + str(self.username))
+
+        return user
+
+    def taskFilters(self, updatedSince: Optional[datetime]) -> List[Any]:
+        user = self.getUser()
+
+        filters = [  # type: ignore
+            ['task_assignees', 'is', {'type': 'HumanUser', 'id': user.id}]
+        ]
+        if updatedSince is not None:
+            filters.append(['updated_at', 'greater_than', updatedSince])
+        return filters
+
+    def getAllTasks(self, updatedSince: Optional[datetime] = None) -> List[Task]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        d: Any = self.sg.find(  # type: ignore
+            "Task", self.taskFilters(updatedSince), fields=TASK_FIELDS,
+            order=[
+                {'field_name': 'due_date', 'direction': 'asc'}
+            ])
+        return [decodeTask(task) for task in d]
+
+    def getTaskPages(self, updatedSince: Optional[datetime] = None, pageSize: int = TASK_PAGE_SIZE) -> Iterator[List[Task]]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        filters = self.taskFilters(updatedSince)
+        page = 1
+        while True:
+            tasks: Any = self.sg.find(  # type: ignore
+                "Task", filters, fields=TASK_FIELDS,
+                order=[
+                    {'field_name': 'due_date', 'direction': 'asc'},
+                    {'field_name': 'id', 'direction': 'asc'}
+                ], limit=pageSize, page=page)
+
+            if len(tasks) > 0:
+                yield [decodeTask(task) for task in tasks]
+            if len(tasks) < pageSize:
+                return
+            page += 1
+
+    def getTasksById(self, taskIds: List[int]) -> List[Task]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        if len(taskIds) == 0:
+            return []
+
+        tasks = self.sg.find("Task", [['id', 'in', taskIds]], fields=TASK_FIELDS)  # type: ignore
+        return [decodeTask(task) for task in tasks]  # type: ignore
+
+    def findTasks(self, query: str) -> List[Task]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        tasks = self.sg.find(  # type: ignore
+            "Task", self.taskFilters(None) + [['content', 'contains', query]], fields=TASK_FIELDS,
+            order=[
+                {'field_name': 'due_date', 'direction': 'asc'}
+            ])
+        return [decodeTask(task) for task in tasks]  # type: ignore
+
+    def getAssignedTasks(self, taskIds: List[int]) -> List[Task]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        if len(taskIds) == 0:
+            return []
+
+        tasks = self.sg.find(  # type: ignore
+            "Task", self.taskFilters(None) + [['id', 'in', taskIds]], fields=TASK_FIELDS)
+        return [decodeTask(task) for task in tasks]  # type: ignore
+
+    def getLatestEventId(self) -> int:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        event = self.sg.find_one("EventLogEntry", [], fields=['id'],  # type: ignore
+                                 order=[{'field_name': 'id', 'direction': 'desc'}])
+        return event['id'] if event is not None else 0  # type: ignore
+
+    def getEvents(self, afterId: int, eventTypes: List[str], limit: int) -> List[Any]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        return self.sg.find("EventLogEntry", [  # type: ignore
+            ['id', 'greater_than', afterId],
+            ['event_type', 'in', eventTypes]
+        ], fields=['event_type', 'entity', 'meta'],
+            order=[{'field_name': 'id', 'direction': 'asc'}], limit=limit)
+
+    def getVersionTasks(self, versionIds: List[int]) -> List[Version]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        if len(versionIds) == 0:
+            return []
+
+        versions = self.sg.find("Version", [['id', 'in', versionIds]], fields=['code', 'sg_task'])  # type: ignore
+        return [decodeVersion(version) for version in versions]  # type: ignore
+
+    def getAttachmentLinks(self, attachmentIds: List[int]) -> List[Attachment]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        if len(attachmentIds) == 0:
+            return []
+
+        attachments = self.sg.find("Attachment", [['id', 'in', attachmentIds]],  # type: ignore
+                                   fields=['attachment_links'])
+        return [decodeAttachment(attachment) for attachment in attachments]  # type: ignore
+
+    def getTaskDetails(self, taskId: int) -> Tuple[Task, Tuple[Version, ...]]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        def loadTask() -> Optional[Tuple[Task, Tuple[Version, ...]]]:
+            entity = self.sg.find_one("Task", [['id', 'is', taskId]],  # type: ignore
+                                      fields=TASK_FIELDS + ['sg_versions'])
+            if entity is None:
+                return None
+            task = decodeTask(entity)  # type: ignore
+            link = EntityLink('Task', task.id, task.name)
+            return task, tuple(Version(version['id'], version.get('name'), link)
+                               for version in entity['sg_versions'] or [])  # type: ignore
+
+        details = self.entities.fetch(('Task', taskId), loadTask)
+        if details is None:
+            raise Exception("Could not find task " + str(taskId))
+        return details
+
+    def getTask(self, taskId: int) -> Task:
+        return self.getTaskDetails(taskId)[0]
+
+    def getTaskVersions(self, taskId: int) -> List[Version]:
+        return list(self.getTaskDetails(taskId)[1])
+
+    def getProjectId(self, taskId: int) -> int:
+        project = self.getTask(taskId).project
+        if project is None:
+            raise Exception("Task " + str(taskId) + " has no project")
+        return project.id
+
+    def getAllPublishedFiles(self, versionId: int) -> List[EntityLink]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        def loadFiles() -> Optional[Tuple[EntityLink, ...]]:
+            version = self.sg.find_one("Version", [['id', 'is', versionId]],  # type: ignore
+                                       fields=['published_files'])
+            if version is None:
+                return None
+            return tuple(decodeLink(file) for file in version['published_files'] or [])  # type: ignore
+
+        return list(self.entities.fetch(('Version', versionId, 'published_files'), loadFiles) or [])
+
+    def getFileUrls(self, versionId: int) -> List[Attachment]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        attachments = self.entities.fetch(
+            ('Version', versionId, 'attachments'),
+            lambda: tuple(decodeAttachment(attachment) for attachment in self.sg.find(  # type: ignore
+                "Attachment", [['attachment_links', 'is', {'type': 'Version', 'id': versionId}]],
+                fields=['this_file', 'file_size', 'updated_at'])))
+
+        return list(attachments)
+
+    def getDownloadPlan(self, taskId: int, offline: bool = True) -> List[Tuple[Version, Attachment]]:
+        # With `offline`, the plan saved by the last successful call is used
+        # when Shotgrid cannot be reached, so files already in the blob cache
+        # can still be laid out.
+        try:
+            return self.fetchDownloadPlan(taskId)
+        except Exception as e:
+            if not offline or self.cache is None or not isTransient(e):
+                raise
+            plan = self.cache.loadPlan(self.account(), taskId)
+            if plan is None:
+                raise
+            return plan
+
+    def fetchDownloadPlan(self, taskId: int) -> List[Tuple[Version, Attachment]]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        versions = self.getTaskVersions(taskId)
+        order = {version.id: index for index, version in enumerate(versions)}
+        byId = {version.id: version for version in versions}
+        ids = list(byId)
+
+        plan: List[Tuple[int, Version, Attachment]] = []
+        for start in range(0, len(ids), ATTACHMENT_QUERY_BATCH):
+            batch = set(ids[start:start + ATTACHMENT_QUERY_BATCH])
+            links = [{'type': 'Version', 'id': id} for id in batch]
+            attachments = self.sg.find("Attachment", [['attachment_links', 'in', links]],  # type: ignore
+                                       fields=['this_file', 'file_size', 'updated_at', 'attachment_links']
+                                       )
+
+            for entity in attachments:  # type: ignore
+                attachment = decodeAttachment(entity)  # type: ignore
+                for link in attachment.links:
+                    if link.type == 'Version' and link.id in batch:
+                        plan.append((order[link.id], byId[link.id], attachment))
+
+        plan.sort(key=lambda entry: (entry[0], entry[2].id))
+        if self.cache is not None:
+            self.cache.savePlan(
+                self.account(), taskId, versions, [(version.id, file) for _, version, file in plan])
+
+        return [(version, file) for _, version, file in plan]
+
+    def downloadFile(self, file: Attachment, location: str, control: Optional[TransferControl] = None) -> 'Future[str]':
+        # Returns as soon as the file is written. The returned future is
+        # resolved on `verifier`, overlapping later downloads, with the
+        # file's sha256, or raises if the file does not match what Shotgrid
+        # reports; bad files are removed.
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        # Attachment ids are per site, the blobs they resolve to are not.
+        site = str(self.url).rstrip('/')
+        updated = file.updatedAt.isoformat() if file.updatedAt is not None else None
+        blobs = self.blobs
+        cached = blobs.lookup(site, file.id, file.size, updated) if blobs is not None else None
+        if blobs is not None and cached is not None:
+            blobs.materialize(cached, location)
+            size = os.path.getsize(location)
+            metrics.addBytes('blob_cache', 'download', 'Attachment', 'received', size)
+            if control is not None:
+                control.progress.update(location, size)
+        else:
+            buckets = [self.downloadLimit] + ([control.bandwidth] if control is not None else [])
+            streamDownload(self.sg, file, location, control=control, buckets=buckets)
+
+        def verify() -> str:
+            try:
+                hash = verifyFile(location, file.size, cached)
+            except Exception:
+                try:
+                    os.remove(location)
+                except OSError:
+                    pass
+                if blobs is not None and cached is not None:
+                    blobs.remove(cached)
+                raise
+
+            if blobs is not None and cached is None:
+                try:
+                    blobs.store(site, file.id, location, updated, hash)
+                except (OSError, sqlite3.Error):
+                    # The file is downloaded; failing to cache it is not an error.
+                    pass
+            return hash
+
+        return self.verifier.submit(verify)
+
+    def fetchThumbnail(self, url: str) -> bytes:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        opener, request = buildRequest(self.sg, url, 0)
+        with opener.open(request) as response:
+            return response.read()
+
+    def createNewVersion(self, taskId: int, projectId: int, versionName: str) -> Version:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        version = self.sg.create("Version", {  # type: ignore
+            'project': {'type': 'Project', 'id': projectId},
+            'code': versionName,
+            'sg_task': {'type': 'Task', 'id': taskId}
+        })
+        self.entities.invalidate('Task', taskId)
+        return decodeVersion(version)  # type: ignore
+
+    def createNewVersions(self, taskId: int, projectId: int, versionNames: List[str]) -> List[Version]:
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        versions = self.sg.batch([{  # type: ignore
+            'request_type': 'create',
+            'entity_type': 'Version',
+            'data': {
+                'project': {'type': 'Project', 'id': projectId},
+                'code': versionName,
+                'sg_task': {'type': 'Task', 'id': taskId}
+            }
+        } for versionName in versionNames])
+        self.entities.invalidate('Task', taskId)
+        return [decodeVersion(version) for version in versions]  # type: ignore
+
+    def uploadFile(self, entityId: int, filepath: str, control: Optional[TransferControl] = None):
+        if self.sg is None:
+            raise Exception("User is not logged in")
+
+        displayName = filepath.split('/').pop()
+        buckets = [self.uploadLimit] + ([control.bandwidth] if control is not None else [])
+        with limited(buckets):
+            self.sg.upload("Version", entityId, filepath, field_name="sg_uploaded_movie",  # type: ignore
+                           display_name=displayName)
+        self.entities.invalidate('Version', entityId)
+
+
+def buildDir(*dir: str):
+    tail = ''
+    for name in dir:
+        tail += name + '/'
+        try:
+            mkdir(tail)
+        except FileExistsError:
+            pass
+
+    return tail
+
+
+def uniqueNames(entries: List[Tuple[int, str]]) -> Dict[int, str]:
+    # Maps ids to names, telling apart entries that share a name by their
+    # id. The lowest id keeps the plain name, so names already on disk stay
+    # put when a newer duplicate turns up.
+    ids: Dict[str, List[int]] = {}
+    for id, name in entries:
+        ids.setdefault(name, []).append(id)
+
+    names = {}
+    for name, group in ids.items():
+        group.sort()
+        names[group[0]] = name
+        base, extension = os.path.splitext(name)
+        for id in group[1:]:
+            names[id] = base + ' (' + str(id) + ')' + extension
+    return names
+
+
+def downloadTargets(plan: List[Tuple[Version, Attachment]]) -> List[Tuple[str, Attachment]]:
+    # Paths relative to the task folder, versions/<version>/<file>, one per
+    # plan entry and never the same for two entries, since concurrent jobs
+    # writing one target would clobber each other.
+    versionNames = uniqueNames(list({version.id: (version.id, str(version.name)) for version, _ in plan}.values()))
+    folders: Dict[int, List[Tuple[int, str]]] = {}
+    for version, file in plan:
+        folders.setdefault(version.id, []).append((file.id, str(file.name)))
+    fileNames = {id: uniqueNames(files) for id, files in folders.items()}
+
+    return [('versions/' + versionNames[version.id] + '/' + fileNames[version.id][file.id], file)
+            for version, file in plan]
+
+
+def verified(result: TransferResult, verifications: Dict[str, 'Future[str]']) -> TransferResult:
+    verification = verifications.get(result.path)
+    if not result.ok or verification is None:
+        return result
+    try:
+        verification.result()
+        return result
+    except Exception as e:
+        return TransferResult(result.path, str(e))
+
+
+def downloadTaskFiles(client: ShotgridClient, taskId: int, taskName: str, outDir: str,
+                      workers: int = DOWNLOAD_WORKERS, control: Optional[TransferControl] = None) -> List[TransferResult]:
+    plan = client.getDownloadPlan(taskId)
+    control = control if control is not None else TransferControl()
+    root = buildDir(outDir, 'tasks', taskName)
+
+    jobs: List[Tuple[str, Any]] = []
+    for name, file in downloadTargets(plan):
+        os.makedirs(os.path.dirname(root + name), exist_ok=True)
+        jobs.append((root + name, file))
+    control.progress.plan({path: file.size for path, file in jobs})
+
+    verifications: Dict[str, 'Future[str]'] = {}
+
+    def downloadJob(client: ShotgridClient, filepath: str, file: Attachment):
+        verifications[filepath] = client.downloadFile(file, filepath, control)
+        control.progress.finish(filepath)
+
+    results = runConcurrently(client, jobs, downloadJob, workers, control)
+    return [verified(result, verifications) for result in results]
+
+
+def mirrorTaskFiles(client: ShotgridClient, taskId: int, taskName: str, outDir: str,
+                    workers: int = DOWNLOAD_WORKERS, control: Optional[TransferControl] = None,
+                    prune: bool = False) -> List[TransferResult]:
+    # Same layout as downloadTaskFiles, but a manifest in the task folder
+    # records what was downloaded so later runs only fetch attachments that
+    # are new or changed on the server. With `prune`, files whose attachment
+    # is gone from the server are removed, so the plan has to come from the
+    # server rather than the offline copy.
+    plan = client.getDownloadPlan(taskId, offline=not prune)
+    control = control if control is not None else TransferControl()
+    root = buildDir(outDir, 'tasks', taskName)
+    manifest = loadManifest(root)
+    mirror = planMirror(root, manifest, downloadTargets(plan))
+
+    jobs: List[Tuple[str, Any]] = []
+    for name, file in mirror.download:
+        os.makedirs(os.path.dirname(root + name), exist_ok=True)
+        jobs.append((root + name, file))
+    control.progress.plan({path: file.size for path, file in jobs})
+    verifications: Dict[str, 'Future[str]'] = {}
+
+    def mirrorJob(client: ShotgridClient, filepath: str, file: Attachment):
+        verifications[filepath] = client.downloadFile(file, filepath, control)
+        control.progress.finish(filepath)
+
+    entries = {name: manifest[name] for name in mirror.unchanged + mirror.removed}
+    results: List[TransferResult] = []
+    try:
+        results = [verified(result, verifications)
+                   for result in runConcurrently(client, jobs, mirrorJob, workers, control)]
+    finally:
+        # Failed, corrupt or cancelled files are left out, so the next run
+        # retries them.
+        for name, file in mirror.download:
+            verification = verifications.get(root + name)
+            if verification is not None and verification.exception() is None:
+                entries[name] = manifestEntry(file, verification.result())
+        if prune:
+            for name in pruneFiles(root, mirror.removed):
+                del entries[name]
+        saveManifest(root, entries)
+
+    return results
+
+
+def uploadTaskFiles(client: ShotgridClient, taskId: int, paths: List[str],
+                    workers: int = UPLOAD_WORKERS, control: Optional[TransferControl] = None) -> List[TransferResult]:
+    displayNames = [path.split('/').pop() for path in paths]
+    versions = client.createNewVersions(
+        taskId, client.getProjectId(taskId), displayNames)
+
+    jobs = [(path, version.id)
+            for path, version in zip(paths, versions)]
+    control = control if control is not None else TransferControl()
+    control.progress.plan({path: os.path.getsize(path) for path in paths})
+
+    def uploadJob(client: ShotgridClient, filepath: str, versionId: int):
+        client.uploadFile(versionId, filepath, control)
+        control.progress.finish(filepath)
+
+    # A failed upload may still have attached the file, so it is only sent
+    # again when the server turned it away.
+    return runConcurrently(client, jobs, uploadJob, workers, control, isRejected)
@@ -1,12 +1,16 @@
+import json
 from dataclasses import dataclass
 from typing import Optional
 
+CONFIG_FILE = ".config.json"
+
 
 @dataclass
 class Credentials:
     url: str
     username: str
     password: str
+    sessionToken: Optional[str] = None
 
 
 @dataclass
@@ -14,3 +18,25 @@ class NullableCredentials:
     url: Optional[str]
     username: Optional[str]
     password: Optional[str]
+    sessionToken: Optional[str] = None
+
+
+def loadConfig():
+    open(CONFIG_FILE, 'a')   # Hack to create file if it doesn't exist
+    with open(CONFIG_FILE, 'r') as file:
+        userConfigFile = file.read()
+
+    if len(userConfigFile) <= 2:
+        return None
+
+    try:
+        userConfigJson = json.loads(userConfigFile)
+    except:
+        return None
+
+    url = userConfigJson.get('url')
+    username = userConfigJson.get('username')
+    password = userConfigJson.get('password')
+    sessionToken = userConfigJson.get('sessionToken')
+
+    return NullableCredentials(url, username, password, sessionToken)
@@ -0,0 +1,129 @@
+from typing import Dict, Tuple
+
+from PySide6 import QtCore, QtWidgets
+
+from src.metrics import Metrics
+
+REFRESH_INTERVAL = 1000
+
+
+def milliseconds(seconds: object) -> str:
+    if not isinstance(seconds, float):
+        return ""
+    return "> 60000" if seconds == float('inf') else "%.0f" % (seconds * 1000)
+
+
+class DiagnosticsPanel(QtWidgets.QWidget):
+    # Live view of `metrics`, refreshed while the panel is visible.
+    metrics: Metrics
+    enabled: QtWidgets.QCheckBox
+    tree: QtWidgets.QTreeWidget
+    bytesLabel: QtWidgets.QLabel
+    cacheLabel: QtWidgets.QLabel
+    timer: QtCore.QTimer
+
+    def __init__(self, metrics: Metrics) -> None:
+        super(DiagnosticsPanel, self).__init__()
+        self.metrics = metrics
+        self.setWindowTitle("Diagnostics")
+        self.resize(720, 420)
+
+        self.enabled = QtWidgets.QCheckBox("Record metrics")
+        self.enabled.setChecked(metrics.enabled)
+        self.enabled.toggled.connect(self.setRecording)
+
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setColumnCount(10)
+        self.tree.setHeaderLabels(["Layer", "Operation", "Entity", "Calls", "Errors",
+                                   "Mean ms", "p50 ms", "p95 ms", "Sent KB", "Received KB"])
+        self.tree.setRootIsDecorated(False)
+        self.tree.setSortingEnabled(True)
+        self.bytesLabel = QtWidgets.QLabel()
+        self.cacheLabel = QtWidgets.QLabel()
+
+        resetButton = QtWidgets.QPushButton("Reset")
+        resetButton.clicked.connect(self.reset)
+        exportButton = QtWidgets.QPushButton("Export...")
+        exportButton.clicked.connect(self.export)
+
+        buttons = QtWidgets.QHBoxLayout()
+        buttons.addWidget(self.enabled)
+        buttons.addStretch()
+        buttons.addWidget(resetButton)
+        buttons.addWidget(exportButton)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(buttons)
+        layout.addWidget(self.tree)
+        layout.addWidget(self.bytesLabel)
+        layout.addWidget(self.cacheLabel)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(REFRESH_INTERVAL)
+        self.timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event: QtCore.QEvent):
+        super(DiagnosticsPanel, self).showEvent(event)  # type: ignore
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event: QtCore.QEvent):
+        super(DiagnosticsPanel, self).hideEvent(event)  # type: ignore
+        self.timer.stop()
+
+    @QtCore.Slot(bool)
+    def setRecording(self, enabled: bool):
+        self.metrics.enabled = enabled
+
+    @QtCore.Slot()
+    def reset(self):
+        self.metrics.reset()
+        self.refresh()
+
+    @QtCore.Slot()
+    def refresh(self):
+        snapshot = self.metrics.snapshot()
+        self.tree.setSortingEnabled(False)
+        self.tree.clear()
+        items: Dict[Tuple[str, str, str], QtWidgets.QTreeWidgetItem] = {}
+        for call in snapshot['calls']:
+            mean = call['seconds'] / call['calls'] if call['calls'] > 0 else None
+            item = QtWidgets.QTreeWidgetItem([
+                call['layer'], call['operation'], call['entity'], "", "",
+                milliseconds(mean), milliseconds(call['p50']), milliseconds(call['p95'])])
+            item.setData(3, QtCore.Qt.ItemDataRole.DisplayRole, call['calls'])
+            item.setData(4, QtCore.Qt.ItemDataRole.DisplayRole, call['errors'])
+            items[call['layer'], call['operation'], call['entity']] = item
+
+        # Downloads and blob cache hits move bytes without a timed call.
+        totals = {'sent': 0, 'received': 0}
+        for entry in snapshot['bytes']:
+            key = (entry['layer'], entry['operation'], entry['entity'])
+            item = items.get(key)
+            if item is None:
+                item = items[key] = QtWidgets.QTreeWidgetItem(list(key))
+            column = 8 if entry['direction'] == 'sent' else 9
+            item.setData(column, QtCore.Qt.ItemDataRole.DisplayRole, round(entry['bytes'] / 1e3))
+            totals[entry['direction']] += entry['bytes']
+
+        for item in items.values():
+            self.tree.addTopLevelItem(item)
+        self.tree.setSortingEnabled(True)
+
+        self.bytesLabel.setText("Sent: %.1f MB   Received: %.1f MB" % (totals['sent'] / 1e6, totals['received'] / 1e6))
+
+        cache = snapshot['entityCache']
+        if cache is None:
+            self.cacheLabel.setText("No entity cache")
+        else:
+            self.cacheLabel.setText("Entity cache: %d hits, %d misses (%.0f%% hit rate), %d entries, %d evicted" % (
+                cache['hits'], cache['misses'], cache['hitRate'] * 100, cache['size'], cache['evictions']))
+
+    @QtCore.Slot()
+    def export(self):
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(  # type: ignore
+            self, "Export metrics", "metrics.json", "JSON (*.json);;Prometheus text (*.prom)")
+        if path == '':
+            return
+
+        self.metrics.export(path)
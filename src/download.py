@@ -0,0 +1,152 @@
+import json
+import os
+import re
+import urllib.error
+import urllib.request
+from http.cookiejar import Cookie, CookieJar
+from typing import Any, Dict, Optional, Sequence
+
+from src.bandwidth import TokenBucket, chunkSize as limitedChunkSize, consume
+from src.entities import Attachment
+from src.metrics import metrics
+from src.transfer import TransferControl
+
+CHUNK_SIZE = 1024 * 1024
+PARTIAL_SUFFIX = '.part'
+VALIDATOR_SUFFIX = '.json'
+
+
+def authCookieHandler(sg: Any) -> urllib.request.HTTPCookieProcessor:
+    # Scoped to the Shotgrid host so the session never leaks to storage redirects.
+    jar = CookieJar()
+    jar.set_cookie(Cookie(
+        0, '_session_id', sg.get_session_token(), None, False,
+        sg.config.server, False, False, '/', True, False, None, True, None, None, {}))
+    return urllib.request.HTTPCookieProcessor(jar)
+
+
+def buildRequest(sg: Any, url: str, offset: int, validator: Optional[str] = None):
+    cookieHandler = authCookieHandler(sg) if sg.config.server in url else None
+    opener = sg._build_opener(cookieHandler)
+
+    request = urllib.request.Request(url)
+    if offset > 0:
+        request.add_header('Range', 'bytes=' + str(offset) + '-')
+        if validator is not None:
+            request.add_header('If-Range', validator)
+
+    return opener, request
+
+
+def totalSize(contentRange: Optional[str]) -> Optional[int]:
+    match = re.match(r'bytes [^/]*/(\d+)', contentRange or '')
+    return int(match.group(1)) if match else None
+
+
+def partialOrigin(attachment: Attachment) -> Dict[str, Any]:
+    return {'id': attachment.id,
+            'updated': attachment.updatedAt.isoformat() if attachment.updatedAt is not None else None}
+
+
+def responseValidator(headers: Any) -> Optional[str]:
+    # If-Range only accepts a strong ETag or a Last-Modified date.
+    etag = headers.get('ETag')
+    if etag is not None and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+def loadPartial(partial: str, attachment: Attachment) -> Optional[Dict[str, Any]]:
+    # What a `.part` file was downloaded from, saved next to it. A partial of
+    # another attachment or an older revision of this one, or one whose
+    # origin is unknown, cannot be resumed.
+    try:
+        with open(partial + VALIDATOR_SUFFIX) as file:
+            origin = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(origin, dict) or {key: origin.get(key) for key in ('id', 'updated')} != partialOrigin(attachment):
+        return None
+    return origin
+
+
+def discardPartial(partial: str):
+    for path in (partial, partial + VALIDATOR_SUFFIX):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def streamDownload(sg: Any, attachment: Attachment, location: str, chunkSize: int = CHUNK_SIZE,
+                   control: Optional[TransferControl] = None, buckets: Sequence[TokenBucket] = ()) -> str:
+    url = attachment.url if attachment.url is not None else sg.get_attachment_download_url(attachment.id)
+    if url is None:
+        raise Exception("Attachment has no download url")
+
+    partial = location + PARTIAL_SUFFIX
+    offset = os.path.getsize(partial) if os.path.isfile(partial) else 0
+    origin = loadPartial(partial, attachment) if offset > 0 else None
+    if offset > 0 and origin is None:
+        discardPartial(partial)
+        offset = 0
+
+    opener, request = buildRequest(sg, url, offset, origin.get('validator') if origin is not None else None)
+    try:
+        response = opener.open(request)
+    except urllib.error.HTTPError as e:
+        if e.code != 416 or offset == 0:
+            raise Exception("Failed to download " + url + ": " + str(e))
+
+        # Range not satisfiable: either the partial file is already complete
+        # or it no longer matches the remote file and has to start over.
+        if totalSize(e.headers.get('Content-Range')) == offset:
+            os.replace(partial, location)
+            discardPartial(partial)
+            return location
+
+        discardPartial(partial)
+        return streamDownload(sg, attachment, location, chunkSize, control, buckets)
+
+    with response:
+        if offset > 0 and response.status != 206:
+            # The server ignored the range, because If-Range did not match
+            # or it does not do ranges: the body is the whole file.
+            offset = 0
+        if offset == 0:
+            with open(partial + VALIDATOR_SUFFIX, 'w') as file:
+                json.dump(dict(partialOrigin(attachment), validator=responseValidator(response.headers)), file)
+
+        length = response.headers.get('Content-Length')
+        expected = offset + int(length) if length is not None else None
+        progress = control.progress if control is not None else None
+        if progress is not None:
+            if expected is not None:
+                progress.expect(location, expected)
+            progress.update(location, offset)
+
+        written = offset
+        with open(partial, 'ab' if offset > 0 else 'wb') as out:
+            while True:
+                if control is not None:
+                    control.checkpoint()
+                chunk = response.read(limitedChunkSize(buckets, chunkSize))
+                if not chunk:
+                    break
+                consume(buckets, len(chunk))
+                out.write(chunk)
+                written += len(chunk)
+                metrics.addBytes('storage', 'download', 'Attachment', 'received', len(chunk))
+                if progress is not None:
+                    progress.update(location, written, len(chunk))
+
+            out.flush()
+            os.fsync(out.fileno())
+
+    if expected is not None and written != expected:
+        raise ConnectionError("Download of " + location + " was interrupted after " +
+                        str(written) + " of " + str(expected) + " bytes")
+
+    os.replace(partial, location)
+    discardPartial(partial)
+    return location
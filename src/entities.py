@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+# Immutable, slotted records that ShotgridClient decodes Shotgun's dicts into
+# once, at the boundary. Slots keep them several times smaller than the
+# dicts they replace and make attribute access cheaper than key lookups.
+# `encode*` turns a record back into a Shotgun-shaped dict for the cache, so
+# cached rows written before these records existed still decode.
+
+
+@dataclass(frozen=True)
+class EntityLink:
+    __slots__ = ('type', 'id', 'name')
+    type: str
+    id: int
+    name: Optional[str]
+
+
+@dataclass(frozen=True)
+class HumanUser:
+    __slots__ = ('id', 'login', 'name')
+    id: int
+    login: Optional[str]
+    name: Optional[str]
+
+
+@dataclass(frozen=True)
+class Task:
+    __slots__ = ('id', 'name', 'dueDate', 'updatedAt', 'image', 'project', 'status')
+    id: int
+    name: str
+    dueDate: Optional[str]
+    updatedAt: Optional[datetime]
+    image: Optional[str]
+    project: Optional[EntityLink]
+    status: Optional[str]
+
+
+@dataclass(frozen=True)
+class Version:
+    __slots__ = ('id', 'name', 'task')
+    id: int
+    name: Optional[str]
+    task: Optional[EntityLink]
+
+
+@dataclass(frozen=True)
+class Attachment:
+    __slots__ = ('id', 'name', 'url', 'contentType', 'size', 'updatedAt', 'links')
+    id: int
+    name: Optional[str]
+    url: Optional[str]
+    contentType: Optional[str]
+    size: Optional[int]
+    updatedAt: Optional[datetime]
+    links: Tuple[EntityLink, ...]
+
+
+def decodeDate(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def decodeLink(link: Optional[Dict[str, Any]]) -> Optional[EntityLink]:
+    if link is None:
+        return None
+    return EntityLink(link['type'], link['id'], link.get('name') or link.get('code') or link.get('content'))
+
+
+def encodeLink(link: Optional[EntityLink]) -> Optional[Dict[str, Any]]:
+    if link is None:
+        return None
+    return {'type': link.type, 'id': link.id, 'name': link.name}
+
+
+def decodeUser(entity: Dict[str, Any]) -> HumanUser:
+    return HumanUser(entity['id'], entity.get('login'), entity.get('name'))
+
+
+def decodeTask(entity: Dict[str, Any]) -> Task:
+    return Task(entity['id'], entity.get('content') or '', entity.get('due_date'),
+                decodeDate(entity.get('updated_at')), entity.get('image'),
+                decodeLink(entity.get('project')), entity.get('sg_status_list'))
+
+
+def encodeTask(task: Task) -> Dict[str, Any]:
+    return {'type': 'Task', 'id': task.id, 'content': task.name, 'due_date': task.dueDate,
+            'updated_at': task.updatedAt.isoformat() if task.updatedAt is not None else None,
+            'image': task.image, 'project': encodeLink(task.project), 'sg_status_list': task.status}
+
+
+def decodeVersion(entity: Dict[str, Any]) -> Version:
+    return Version(entity['id'], entity.get('code') or entity.get('name'), decodeLink(entity.get('sg_task')))
+
+
+def encodeVersion(version: Version) -> Dict[str, Any]:
+    return {'type': 'Version', 'id': version.id, 'code': version.name, 'sg_task': encodeLink(version.task)}
+
+
+def decodeAttachment(entity: Dict[str, Any]) -> Attachment:
+    # Plans cached before this module stored the bare `this_file` dict.
+    file = entity.get('this_file') or entity
+    links = tuple(decodeLink(link) for link in entity.get('attachment_links') or [])
+    return Attachment(entity['id'], file.get('name'), file.get('url'), file.get('content_type'),
+                      entity.get('file_size', entity.get('size')), decodeDate(entity.get('updated_at')),
+                      links)  # type: ignore
+
+
+def encodeAttachment(attachment: Attachment) -> Dict[str, Any]:
+    return {'type': 'Attachment', 'id': attachment.id, 'file_size': attachment.size,
+            'updated_at': attachment.updatedAt.isoformat() if attachment.updatedAt is not None else None,
+            'this_file': {'name': attachment.name, 'url': attachment.url,
+                          'content_type': attachment.contentType},
+            'attachment_links': [encodeLink(link) for link in attachment.links]}
@@ -0,0 +1,95 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Hashable, Tuple
+
+ENTITY_CACHE_SIZE = 2048
+ENTITY_CACHE_TTL = 300.0
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    size: int = 0
+
+    @property
+    def hitRate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+class EntityCache:
+    # Read-through cache for entity lookups, keyed by tuples that start with
+    # (entityType, id). Entries expire after `ttl` seconds and the least
+    # recently used entry is evicted once `maxSize` is reached. Shared by every
+    # connection of a client, so all access goes through `lock`.
+    maxSize: int
+    ttl: float
+    entries: 'OrderedDict[Hashable, Tuple[float, Any]]'
+    lock: Lock
+    counters: CacheStats
+
+    def __init__(self, maxSize: int = ENTITY_CACHE_SIZE, ttl: float = ENTITY_CACHE_TTL,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.counters = CacheStats()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters.misses += 1
+                return False, None
+
+            expires, value = entry
+            if expires <= self.clock():
+                del self.entries[key]
+                self.counters.misses += 1
+                return False, None
+
+            self.entries.move_to_end(key)
+            self.counters.hits += 1
+            return True, value
+
+    def put(self, key: Hashable, value: Any):
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+                self.counters.evictions += 1
+
+    def fetch(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        found, value = self.get(key)
+        if found:
+            return value
+
+        value = load()
+        if value is not None:
+            self.put(key, value)
+        return value
+
+    def invalidate(self, entityType: str, id: Any):
+        with self.lock:
+            stale = [key for key in self.entries
+                     if isinstance(key, tuple) and key[:2] == (entityType, id)]
+            for key in stale:
+                del self.entries[key]
+            self.counters.invalidations += len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> CacheStats:
+        with self.lock:
+            return CacheStats(self.counters.hits, self.counters.misses, self.counters.evictions,
+                              self.counters.invalidations, len(self.entries))
@@ -1,8 +0,0 @@
-from PySide6 import QtWidgets
-
-
-class QVLine(QtWidgets.QFrame):
-    def __init__(self):
-        super(QVLine, self).__init__()
-        self.setFrameShape(QtWidgets.QFrame.Shape.VLine)
-        self.setFrameShadow(QtWidgets.QFrame.Shadow.Sunken)
@@ -0,0 +1,237 @@
+import functools
+import inspect
+import json
+import os
+import time
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, field
+from threading import Lock, local
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.entitycache import CacheStats
+
+METRICS_ENV = 'SHOTGRID_METRICS'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CallKey = Tuple[str, str, str]
+# A CallKey followed by 'sent' or 'received'.
+BytesKey = Tuple[str, str, str, str]
+
+
+@dataclass
+class CallStats:
+    calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Upper bound of the bucket holding the q-th call, so an estimate
+        # that errs on the slow side.
+        if self.calls == 0:
+            return None
+        wanted = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= wanted:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    # Call counts, latency histograms, error counts and bytes transferred,
+    # keyed by (layer, operation, entity type). Layers are 'client' for
+    # ShotgridClient methods, 'api' for Shotgun RPCs, 'storage' for file
+    # bodies and 'blob_cache' for files served locally. Recording is skipped entirely while `enabled` is False.
+    # `entityCache` reads the counters the client's EntityCache keeps anyway.
+    enabled: bool
+    calls: Dict[CallKey, CallStats]
+    bytes: Dict[BytesKey, int]
+    entityCache: Optional[Callable[[], CacheStats]] = None
+    lock: Lock
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.calls = {}
+        self.bytes = {}
+        self.lock = Lock()
+        self.started = time.time()
+
+    def observe(self, layer: str, operation: str, entityType: Optional[str], seconds: float, error: bool = False):
+        key = (layer, operation, entityType or '')
+        with self.lock:
+            stats = self.calls.get(key)
+            if stats is None:
+                stats = self.calls[key] = CallStats()
+            stats.calls += 1
+            stats.errors += 1 if error else 0
+            stats.seconds += seconds
+            stats.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def addBytes(self, layer: str, operation: str, entityType: Optional[str], direction: str, count: int):
+        if not self.enabled:
+            return
+        key = (layer, operation, entityType or '', direction)
+        with self.lock:
+            self.bytes[key] = self.bytes.get(key, 0) + count
+
+    def reset(self):
+        with self.lock:
+            self.calls = {}
+            self.bytes = {}
+            self.started = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        cache = self.entityCache() if self.entityCache is not None else None
+        with self.lock:
+            return {
+                'since': self.started,
+                'calls': [{
+                    'layer': layer, 'operation': operation, 'entity': entity,
+                    'calls': stats.calls, 'errors': stats.errors, 'seconds': stats.seconds,
+                    'p50': stats.quantile(0.5), 'p95': stats.quantile(0.95),
+                    'buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], stats.buckets)),
+                } for (layer, operation, entity), stats in sorted(self.calls.items())],
+                'bytes': [{
+                    'layer': layer, 'operation': operation, 'entity': entity, 'direction': direction, 'bytes': count,
+                } for (layer, operation, entity, direction), count in sorted(self.bytes.items())],
+                'entityCache': dict(asdict(cache), hitRate=cache.hitRate) if cache is not None else None,
+            }
+
+    def toJson(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def toPrometheus(self) -> str:
+        # The exposition format wants every sample of a family right after
+        # its TYPE line, so samples are collected per family first.
+        cache = self.entityCache() if self.entityCache is not None else None
+        families: Dict[Tuple[str, str], List[str]] = {
+            ('shotgrid_calls_total', 'counter'): [],
+            ('shotgrid_errors_total', 'counter'): [],
+            ('shotgrid_call_seconds', 'histogram'): [],
+            ('shotgrid_bytes_total', 'counter'): [],
+        }
+        calls = families['shotgrid_calls_total', 'counter']
+        errors = families['shotgrid_errors_total', 'counter']
+        seconds = families['shotgrid_call_seconds', 'histogram']
+        transferred = families['shotgrid_bytes_total', 'counter']
+        with self.lock:
+            for (layer, operation, entity), stats in sorted(self.calls.items()):
+                labels = 'layer="%s",operation="%s",entity="%s"' % (layer, operation, entity)
+                calls.append('shotgrid_calls_total{%s} %d' % (labels, stats.calls))
+                errors.append('shotgrid_errors_total{%s} %d' % (labels, stats.errors))
+                cumulative = 0
+                for bound, count in zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], stats.buckets):
+                    cumulative += count
+                    seconds.append('shotgrid_call_seconds_bucket{%s,le="%s"} %d' % (labels, bound, cumulative))
+                seconds.append('shotgrid_call_seconds_sum{%s} %f' % (labels, stats.seconds))
+                seconds.append('shotgrid_call_seconds_count{%s} %d' % (labels, stats.calls))
+            for (layer, operation, entity, direction), count in sorted(self.bytes.items()):
+                transferred.append('shotgrid_bytes_total{layer="%s",operation="%s",entity="%s",direction="%s"} %d' % (
+                    layer, operation, entity, direction, count))
+        if cache is not None:
+            for name in ('hits', 'misses', 'evictions', 'invalidations'):
+                families['shotgrid_entity_cache_%s_total' % name, 'counter'] = [
+                    'shotgrid_entity_cache_%s_total %d' % (name, getattr(cache, name))]
+            families['shotgrid_entity_cache_entries', 'gauge'] = ['shotgrid_entity_cache_entries %d' % cache.size]
+
+        lines = []
+        for (name, kind), samples in families.items():
+            lines.append('# TYPE %s %s' % (name, kind))
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str):
+        with open(path, 'w') as file:
+            file.write(self.toPrometheus() if path.endswith(('.prom', '.txt')) else self.toJson())
+
+
+metrics = Metrics(enabled=bool(os.environ.get(METRICS_ENV)))
+
+
+def traced(layer: str, operation: str, entityType: Optional[str] = None) -> Callable[[Callable], Callable]:
+    def decorate(function: Callable) -> Callable:
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def tracedGenerator(*args: Any, **kwargs: Any) -> Any:
+                if not metrics.enabled:
+                    return (yield from function(*args, **kwargs))
+                started = time.perf_counter()
+                error = False
+                try:
+                    return (yield from function(*args, **kwargs))
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    metrics.observe(layer, operation, entityType, time.perf_counter() - started, error)
+            return tracedGenerator
+
+        @functools.wraps(function)
+        def tracedFunction(*args: Any, **kwargs: Any) -> Any:
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            error = False
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                metrics.observe(layer, operation, entityType, time.perf_counter() - started, error)
+        return tracedFunction
+    return decorate
+
+
+def traceMethods(cls: type) -> type:
+    # Traces every public method defined on `cls` under the 'client' layer.
+    for name, member in list(vars(cls).items()):
+        if not name.startswith('_') and inspect.isfunction(member):
+            setattr(cls, name, traced('client', name)(member))
+    return cls
+
+
+def traceConnection(sg: Any) -> Any:
+    # Wraps the few Shotgun internals every request goes through, so each
+    # RPC is timed and its request and response bodies are counted, tagged
+    # with its method and entity type, as are upload bodies.
+    callRpc = sg._call_rpc
+    makeCall = sg._make_call
+    uploadData = sg._upload_data_to_storage
+    # _make_call only sees the encoded body, so the RPC it belongs to is
+    # handed down from _call_rpc on the same thread.
+    current = local()
+
+    def tracedCallRpc(method: str, params: Any, *args: Any, **kwargs: Any) -> Any:
+        if not metrics.enabled:
+            return callRpc(method, params, *args, **kwargs)
+        entityType = params.get('type') if isinstance(params, dict) else None
+        # Building the payload can itself call `info` first.
+        outer = getattr(current, 'rpc', None)
+        current.rpc = (method, entityType)
+        try:
+            return traced('api', method, entityType)(callRpc)(method, params, *args, **kwargs)
+        finally:
+            current.rpc = outer
+
+    def tracedMakeCall(verb: str, path: str, body: Any, headers: Any) -> Any:
+        response = makeCall(verb, path, body, headers)
+        if metrics.enabled:
+            method, entityType = getattr(current, 'rpc', None) or (verb.lower(), None)
+            metrics.addBytes('api', method, entityType, 'sent', len(body or b''))
+            metrics.addBytes('api', method, entityType, 'received', len(response[2] or b''))
+        return response
+
+    def tracedUploadData(data: Any, contentType: str, size: int, url: str) -> Any:
+        if not metrics.enabled:
+            return uploadData(data, contentType, size, url)
+        etag = traced('storage', 'upload')(uploadData)(data, contentType, size, url)
+        metrics.addBytes('storage', 'upload', None, 'sent', size)
+        return etag
+
+    sg._call_rpc = tracedCallRpc
+    sg._make_call = tracedMakeCall
+    sg._upload_data_to_storage = tracedUploadData
+    return sg
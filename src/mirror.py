@@ -0,0 +1,110 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.entities import Attachment
+
+MANIFEST_FILE = '.manifest.json'
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ManifestEntry:
+    id: int
+    size: Optional[int]
+    updatedAt: Optional[str]
+    hash: Optional[str] = None
+
+
+@dataclass
+class MirrorPlan:
+    download: List[Tuple[str, Attachment]] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+
+def manifestPath(root: str) -> str:
+    return os.path.join(root, MANIFEST_FILE)
+
+
+def loadManifest(root: str) -> Dict[str, ManifestEntry]:
+    # Keys are paths relative to `root`. A missing or unreadable manifest
+    # just means everything is downloaded again.
+    try:
+        with open(manifestPath(root)) as file:
+            data = json.load(file)
+        return {path: ManifestEntry(**entry) for path, entry in data['files'].items()}
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+
+
+def saveManifest(root: str, entries: Dict[str, ManifestEntry]):
+    path = manifestPath(root)
+    with open(path + '.tmp', 'w') as file:
+        json.dump({'version': MANIFEST_VERSION,
+                   'files': {name: asdict(entry) for name, entry in sorted(entries.items())}}, file, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def manifestEntry(file: Attachment, hash: Optional[str] = None) -> ManifestEntry:
+    return ManifestEntry(file.id, file.size, file.updatedAt.isoformat() if file.updatedAt is not None else None, hash)
+
+
+def unchanged(entry: Optional[ManifestEntry], file: Attachment, location: str) -> bool:
+    # Only metadata is compared; the stored hash is there to verify the
+    # local copy on demand, not on every run.
+    if entry is None or entry != manifestEntry(file, entry.hash):
+        return False
+    try:
+        return entry.size is None or os.path.getsize(location) == entry.size
+    except OSError:
+        return False
+
+
+def planMirror(root: str, manifest: Dict[str, ManifestEntry], files: List[Tuple[str, Attachment]]) -> MirrorPlan:
+    # `files` are (path relative to root, attachment) as on the server now.
+    # Entries are keyed by path (an attachment linked to two versions has
+    # two), so two attachments on one path would never settle.
+    plan = MirrorPlan()
+    seen: Dict[str, int] = {}
+    for name, file in files:
+        if name in seen:
+            if seen[name] != file.id:
+                raise Exception("Attachments " + str(seen[name]) + " and " + str(file.id) +
+                                " would both be mirrored to " + name)
+            continue
+        seen[name] = file.id
+
+        if unchanged(manifest.get(name), file, os.path.join(root, name)):
+            plan.unchanged.append(name)
+        else:
+            plan.download.append((name, file))
+
+    current = set(name for name, _ in files)
+    plan.removed = [name for name in manifest if name not in current]
+    return plan
+
+
+def pruneFiles(root: str, names: List[str]) -> List[str]:
+    # Only files the manifest knows we downloaded are ever removed, then
+    # any version folders left empty.
+    pruned = []
+    for name in names:
+        path = os.path.join(root, name)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            continue
+        pruned.append(name)
+
+        dir = os.path.dirname(path)
+        while os.path.abspath(dir) != os.path.abspath(root):
+            try:
+                os.rmdir(dir)
+            except OSError:
+                break
+            dir = os.path.dirname(dir)
+    return pruned
@@ -0,0 +1,136 @@
+import time
+from threading import Condition, Thread, current_thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MAX_CONNECTIONS = 16
+IDLE_CHECK_AFTER = 30.0
+ACQUIRE_TIMEOUT = 60.0
+
+
+class ConnectionPool:
+    # Hands every thread its own connection made by `factory`. A thread keeps
+    # its connection until it calls `release()` (or exits), after which the
+    # connection goes back to the idle list and is reused by the next thread,
+    # keeping its HTTP connection alive. Idle connections are health checked
+    # before reuse once they have been idle for `idleCheckAfter` seconds. At
+    # most `maxSize` connections exist; further threads wait for one.
+    factory: Callable[[], Any]
+    maxSize: int
+    idleCheckAfter: float
+    timeout: float
+    owners: Dict[int, Tuple[Thread, Any]]
+    idle: List[Tuple[float, Any]]
+    opened: int
+    closed: bool
+    condition: Condition
+
+    def __init__(self, factory: Callable[[], Any], maxSize: int = MAX_CONNECTIONS,
+                 idleCheckAfter: float = IDLE_CHECK_AFTER, timeout: float = ACQUIRE_TIMEOUT,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.factory = factory
+        self.maxSize = maxSize
+        self.idleCheckAfter = idleCheckAfter
+        self.timeout = timeout
+        self.clock = clock
+        self.owners = {}
+        self.idle = []
+        self.opened = 0
+        self.closed = False
+        self.condition = Condition()
+
+    def connection(self) -> Any:
+        thread = current_thread()
+        with self.condition:
+            owned = self.owners.get(thread.ident)  # type: ignore
+            if owned is not None and owned[0] is thread:
+                return owned[1]
+
+            connection, idleSince = self.reserve()
+
+        try:
+            if connection is None:
+                connection = self.factory()
+            elif self.clock() - idleSince >= self.idleCheckAfter and not self.healthy(connection):
+                self.closeQuietly(connection)
+                connection = self.factory()
+        except Exception:
+            with self.condition:
+                if not self.closed:
+                    self.opened -= 1
+                    self.condition.notify()
+            raise
+
+        with self.condition:
+            if self.closed:
+                self.closeQuietly(connection)
+                raise Exception("Connection pool is closed")
+            self.owners[thread.ident] = (thread, connection)  # type: ignore
+        return connection
+
+    def reserve(self) -> Tuple[Optional[Any], float]:
+        # Called with the lock held. Returns an idle connection or (None, 0)
+        # when the caller may open a new one.
+        deadline = self.clock() + self.timeout
+        while True:
+            if self.closed:
+                raise Exception("Connection pool is closed")
+
+            self.reclaim()
+            if len(self.idle) > 0:
+                idleSince, connection = self.idle.pop()
+                return connection, idleSince
+            if self.opened < self.maxSize:
+                self.opened += 1
+                return None, 0.0
+
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                raise Exception("No Shotgrid connection became available within %d seconds" % self.timeout)
+            self.condition.wait(remaining)
+
+    def reclaim(self):
+        for ident, (thread, connection) in list(self.owners.items()):
+            if not thread.is_alive():
+                del self.owners[ident]
+                self.idle.append((self.clock(), connection))
+
+    def release(self):
+        thread = current_thread()
+        with self.condition:
+            owned = self.owners.get(thread.ident)  # type: ignore
+            if owned is None or owned[0] is not thread:
+                return
+
+            del self.owners[thread.ident]  # type: ignore
+            self.idle.append((self.clock(), owned[1]))
+            self.condition.notify()
+
+    def healthy(self, connection: Any) -> bool:
+        try:
+            connection.info()
+            return True
+        except Exception:
+            return False
+
+    def closeQuietly(self, connection: Any):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            connections = [connection for _, connection in self.owners.values()] + \
+                [connection for _, connection in self.idle]
+            self.owners = {}
+            self.idle = []
+            self.opened = 0
+            self.condition.notify_all()
+
+        for connection in connections:
+            self.closeQuietly(connection)
+
+    def size(self) -> int:
+        with self.condition:
+            return self.opened
@@ -0,0 +1,249 @@
+import heapq
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Any, Dict, List, Optional
+
+from PySide6 import QtCore
+
+MAX_CONCURRENT_TRANSFERS = 3
+KIND_LIMITS = {'download': 2, 'upload': 2}
+
+QUEUED = 'Queued'
+RUNNING = 'Running'
+PAUSED = 'Paused'
+CANCELLING = 'Cancelling'
+CANCELLED = 'Cancelled'
+DONE = 'Done'
+FAILED = 'Failed'
+
+FINISHED_STATES = (CANCELLED, DONE, FAILED)
+
+
+@dataclass
+class Transfer:
+    id: int
+    kind: str
+    label: str
+    priority: int
+    runnable: Any
+    state: str = QUEUED
+    started: bool = False
+    # Counted in `running`: started and neither paused nor waiting to resume.
+    active: bool = False
+    result: Any = None
+    error: Optional[str] = None
+
+
+@dataclass(order=True)
+class QueueEntry:
+    priority: int
+    sequence: int
+    transferId: int = field(compare=False)
+
+
+class TransferScheduler(QtCore.QObject):
+    # Runnables submitted here must expose `signals` (result / error) and a
+    # `control` (TransferControl) used for pause, resume and cancellation.
+    # A paused transfer does not count against the limits; resuming a
+    # started one queues it again, and its worker carries on once there is
+    # room for it.
+    changed = QtCore.Signal(int)
+    finished = QtCore.Signal(int)
+
+    threadpool: QtCore.QThreadPool
+    maxConcurrent: int
+    kindLimits: Dict[str, int]
+    transfers: Dict[int, Transfer]
+    senders: Dict[Any, int]
+    queue: List[QueueEntry]
+    running: Dict[str, int]
+
+    def __init__(self, threadpool: QtCore.QThreadPool, maxConcurrent: int = MAX_CONCURRENT_TRANSFERS,
+                 kindLimits: Optional[Dict[str, int]] = None) -> None:
+        super(TransferScheduler, self).__init__()
+        self.threadpool = threadpool
+        self.maxConcurrent = maxConcurrent
+        self.kindLimits = dict(KIND_LIMITS if kindLimits is None else kindLimits)
+        self.transfers = {}
+        self.senders = {}
+        self.queue = []
+        self.running = {}
+        self.ids = count(1)
+        self.sequence = count()
+        self.reserveThreads()
+
+    def reserveThreads(self):
+        # Transfers are I/O bound and paused ones keep their worker thread
+        # while others run in their place, so the pool must not be sized by
+        # CPU count alone.
+        parked = sum(1 for transfer in self.transfers.values()
+                     if transfer.started and not transfer.active and transfer.state not in FINISHED_STATES)
+        needed = self.maxConcurrent + parked + 1
+        if self.threadpool.maxThreadCount() < needed:
+            self.threadpool.setMaxThreadCount(needed)
+
+    def submit(self, kind: str, label: str, runnable: Any, priority: int = 0) -> int:
+        transfer = Transfer(next(self.ids), kind, label, priority, runnable)
+        self.transfers[transfer.id] = transfer
+
+        # Bound slots (rather than lambdas) so the worker's signals are queued
+        # onto the GUI thread; the sender identifies the transfer.
+        self.senders[runnable.signals] = transfer.id
+        runnable.signals.result.connect(self.transferSucceeded)
+        runnable.signals.error.connect(self.transferFailed)
+
+        self.enqueue(transfer)
+        self.changed.emit(transfer.id)
+        self.dispatch()
+        return transfer.id
+
+    def enqueue(self, transfer: Transfer):
+        # Resumed transfers already hold a thread and part of their work, so
+        # they go ahead of ones not started yet at the same priority.
+        sequence = next(self.sequence)
+        heapq.heappush(self.queue, QueueEntry(
+            -transfer.priority, -sequence if transfer.started else sequence, transfer.id))
+
+    def runningCount(self) -> int:
+        return sum(self.running.values())
+
+    def hasCapacity(self, kind: str) -> bool:
+        if self.runningCount() >= self.maxConcurrent:
+            return False
+
+        limit = self.kindLimits.get(kind)
+        return limit is None or self.running.get(kind, 0) < limit
+
+    def dispatch(self):
+        skipped: List[QueueEntry] = []
+        while len(self.queue) > 0 and self.runningCount() < self.maxConcurrent:
+            entry = heapq.heappop(self.queue)
+            transfer = self.transfers.get(entry.transferId)
+            if transfer is None or entry.priority != -transfer.priority:
+                continue
+
+            if transfer.state == PAUSED:
+                skipped.append(entry)
+                continue
+
+            if transfer.state != QUEUED:
+                continue
+
+            if not self.hasCapacity(transfer.kind):
+                skipped.append(entry)
+                continue
+
+            if transfer.started:
+                self.activate(transfer)
+                transfer.runnable.control.resume()
+                self.changed.emit(transfer.id)
+            else:
+                self.start(transfer)
+
+        for entry in skipped:
+            heapq.heappush(self.queue, entry)
+
+    def start(self, transfer: Transfer):
+        transfer.started = True
+        self.activate(transfer)
+        self.threadpool.start(transfer.runnable)  # type: ignore
+        self.changed.emit(transfer.id)
+
+    def activate(self, transfer: Transfer):
+        transfer.state = RUNNING
+        transfer.active = True
+        self.running[transfer.kind] = self.running.get(transfer.kind, 0) + 1
+
+    def deactivate(self, transfer: Transfer):
+        if transfer.active:
+            transfer.active = False
+            self.running[transfer.kind] -= 1
+
+    def complete(self, transfer: Transfer, state: str):
+        transfer.state = state
+        self.deactivate(transfer)
+        self.changed.emit(transfer.id)
+        self.finished.emit(transfer.id)
+        self.dispatch()
+
+    def senderTransfer(self) -> Transfer:
+        return self.transfers[self.senders.pop(self.sender())]
+
+    @QtCore.Slot(object)
+    def transferSucceeded(self, result: Any):
+        transfer = self.senderTransfer()
+        transfer.result = result
+        self.complete(transfer, DONE)
+
+    @QtCore.Slot(object)
+    def transferFailed(self, error: Any):
+        transfer = self.senderTransfer()
+        transfer.error = str(error)
+        cancelled = transfer.runnable.control.cancelled.is_set()
+        self.complete(transfer, CANCELLED if cancelled else FAILED)
+
+    def cancel(self, id: int):
+        transfer = self.transfers[id]
+        if transfer.state in FINISHED_STATES:
+            return
+
+        if not transfer.started:
+            transfer.state = CANCELLED
+            self.senders.pop(transfer.runnable.signals, None)
+            self.changed.emit(id)
+            self.finished.emit(id)
+            return
+
+        transfer.state = CANCELLING
+        transfer.runnable.control.cancel()
+        self.changed.emit(id)
+
+    def pause(self, id: int):
+        transfer = self.transfers[id]
+        if transfer.state not in (QUEUED, RUNNING):
+            return
+
+        transfer.runnable.control.pause()
+        transfer.state = PAUSED
+        if transfer.active:
+            self.deactivate(transfer)
+            self.reserveThreads()
+        self.changed.emit(id)
+        self.dispatch()
+
+    def resume(self, id: int):
+        transfer = self.transfers[id]
+        if transfer.state != PAUSED:
+            return
+
+        # The control stays paused until dispatch finds room for the transfer.
+        transfer.state = QUEUED
+        if transfer.started:
+            self.enqueue(transfer)
+        self.changed.emit(id)
+        self.dispatch()
+
+    def setPriority(self, id: int, priority: int):
+        transfer = self.transfers[id]
+        transfer.priority = priority
+        if not transfer.started or transfer.state == QUEUED:
+            self.enqueue(transfer)
+            self.dispatch()
+        self.changed.emit(id)
+
+    def setLimits(self, maxConcurrent: int, kindLimits: Optional[Dict[str, int]] = None):
+        self.maxConcurrent = maxConcurrent
+        if kindLimits is not None:
+            self.kindLimits = dict(kindLimits)
+        self.reserveThreads()
+        self.dispatch()
+
+    def clearFinished(self) -> List[int]:
+        removed = [id for id, transfer in self.transfers.items()
+                   if transfer.state in FINISHED_STATES and transfer.runnable.signals not in self.senders]
+        for id in removed:
+            del self.transfers[id]
+        return removed
+
+    def get(self, id: int) -> Optional[Transfer]:
+        return self.transfers.get(id)
@@ -0,0 +1,93 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from src.entities import Task
+
+TASK_EVENTS = ['Shotgun_Task_New', 'Shotgun_Task_Change',
+               'Shotgun_Task_Retirement', 'Shotgun_Task_Revival']
+VERSION_EVENTS = ['Shotgun_Version_New', 'Shotgun_Version_Change',
+                  'Shotgun_Version_Retirement', 'Shotgun_Version_Revival']
+ATTACHMENT_EVENTS = ['Shotgun_Attachment_New', 'Shotgun_Attachment_Change',
+                     'Shotgun_Attachment_Retirement', 'Shotgun_Attachment_Revival']
+
+EVENT_PAGE_SIZE = 500
+MAX_EVENT_PAGES = 10
+EVENT_CURSOR = 'event_log'
+
+
+@dataclass
+class TaskDelta:
+    updated: List[Task] = field(default_factory=list)
+    removed: List[int] = field(default_factory=list)
+    cursor: Optional[int] = None
+
+    def empty(self) -> bool:
+        return len(self.updated) == 0 and len(self.removed) == 0
+
+
+def eventEntityId(event: Dict[str, Any]) -> Optional[int]:
+    # Retired entities are no longer linked from the event, only named in meta.
+    entity = event.get('entity')
+    if entity is not None:
+        return entity.get('id')
+    return (event.get('meta') or {}).get('entity_id')
+
+
+def changedIds(events: List[Dict[str, Any]], eventTypes: List[str]) -> Set[int]:
+    ids = set()
+    for event in events:
+        if event['event_type'] in eventTypes:
+            id = eventEntityId(event)
+            if id is not None:
+                ids.add(id)
+    return ids
+
+
+def affectedTasks(client: Any, events: List[Dict[str, Any]]) -> Set[int]:
+    tasks = changedIds(events, TASK_EVENTS)
+    versions = changedIds(events, VERSION_EVENTS)
+
+    for attachment in client.getAttachmentLinks(list(changedIds(events, ATTACHMENT_EVENTS))):
+        for link in attachment.links:
+            if link.type == 'Version':
+                versions.add(link.id)
+            elif link.type == 'Task':
+                tasks.add(link.id)
+
+    for version in client.getVersionTasks(list(versions)):
+        client.entities.invalidate('Version', version.id)
+        if version.task is not None:
+            tasks.add(version.task.id)
+
+    return tasks
+
+
+def pollTaskChanges(client: Any, cursor: Optional[int], known: Set[int]) -> TaskDelta:
+    # Reads the event log after `cursor` and turns it into task list changes
+    # for the logged in user: tasks that are (still) assigned are re-read,
+    # `known` tasks that are retired or no longer assigned are removed.
+    if cursor is None:
+        return TaskDelta(cursor=client.getLatestEventId())
+
+    events: List[Dict[str, Any]] = []
+    for _ in range(MAX_EVENT_PAGES):
+        page = client.getEvents(cursor, TASK_EVENTS + VERSION_EVENTS + ATTACHMENT_EVENTS,
+                                EVENT_PAGE_SIZE)
+        events.extend(page)
+        if len(page) > 0:
+            cursor = page[-1]['id']
+        if len(page) < EVENT_PAGE_SIZE:
+            break
+
+    delta = TaskDelta(cursor=cursor)
+    taskIds = affectedTasks(client, events)
+    if len(taskIds) == 0:
+        return delta
+
+    for id in taskIds:
+        client.entities.invalidate('Task', id)
+
+    delta.updated = client.getAssignedTasks(list(taskIds))
+    assigned = set(task.id for task in delta.updated)
+    delta.removed = [id for id in taskIds if id in known and id not in assigned]
+    return delta
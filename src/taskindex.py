@@ -0,0 +1,152 @@
+import re
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.entities import Task
+
+TOKEN = re.compile(r'[^\W_]+')
+
+SORT_KEYS: Dict[str, Callable[[Task], Tuple]] = {
+    'due': lambda row: (row.dueDate is None, row.dueDate or '', row.id),
+    'name': lambda row: (row.name.lower(), row.id),
+    'updated': lambda row: (row.updatedAt is not None, row.updatedAt.timestamp() if row.updatedAt else 0, row.id),
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.lower())
+
+
+@dataclass
+class TaskQuery:
+    # Every word of `text` has to start a word of the task name. Due dates
+    # are ISO dates and both ends of the range are inclusive.
+    text: str = ''
+    dueFrom: Optional[str] = None
+    dueTo: Optional[str] = None
+    project: Optional[str] = None
+    status: Optional[str] = None
+
+
+class TaskIndex:
+    # Inverted index over the loaded tasks so filtering and sorting never
+    # go back to the server. Postings are sets of task ids; the sorted token
+    # list (for prefix search) and the sort orders are rebuilt lazily after
+    # a change, so adding rows in slices stays cheap.
+    rows: Dict[int, Task]
+    postings: Dict[str, Set[int]]
+    projects: Dict[str, Set[int]]
+    statuses: Dict[str, Set[int]]
+    tokens: Optional[List[str]]
+    orders: Dict[str, List[int]]
+    dues: Optional[Tuple[List[str], List[int]]]
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self):
+        self.rows = {}
+        self.postings = {}
+        self.projects = {}
+        self.statuses = {}
+        self.changed()
+
+    def changed(self):
+        self.tokens = None
+        self.orders = {}
+        self.dues = None
+
+    def add(self, rows: Iterable[Task]):
+        for row in rows:
+            if row.id in self.rows:
+                self.discard(row.id)
+            self.rows[row.id] = row
+            for token in set(tokenize(row.name)):
+                self.postings.setdefault(token, set()).add(row.id)
+            if row.project is not None and row.project.name is not None:
+                self.projects.setdefault(row.project.name, set()).add(row.id)
+            if row.status is not None:
+                self.statuses.setdefault(row.status, set()).add(row.id)
+        self.changed()
+
+    def remove(self, ids: Iterable[int]):
+        for id in ids:
+            self.discard(id)
+        self.changed()
+
+    def discard(self, id: int):
+        row = self.rows.pop(id, None)
+        if row is None:
+            return
+
+        for token in set(tokenize(row.name)):
+            unlink(self.postings, token, id)
+        if row.project is not None and row.project.name is not None:
+            unlink(self.projects, row.project.name, id)
+        if row.status is not None:
+            unlink(self.statuses, row.status, id)
+
+    def projectNames(self) -> List[str]:
+        return sorted(self.projects)
+
+    def statusNames(self) -> List[str]:
+        return sorted(self.statuses)
+
+    def matchingToken(self, prefix: str) -> Set[int]:
+        if self.tokens is None:
+            self.tokens = sorted(self.postings)
+        start = bisect_left(self.tokens, prefix)
+        end = bisect_left(self.tokens, prefix + '\U0010ffff', start)
+        if end - start == 1:
+            return self.postings[self.tokens[start]]
+
+        ids: Set[int] = set()
+        for token in self.tokens[start:end]:
+            ids |= self.postings[token]
+        return ids
+
+    def dueBetween(self, dueFrom: Optional[str], dueTo: Optional[str]) -> Set[int]:
+        if self.dues is None:
+            dated = sorted((row.dueDate, row.id) for row in self.rows.values() if row.dueDate is not None)
+            self.dues = ([due for due, _ in dated], [id for _, id in dated])
+        dues, ids = self.dues
+        start = bisect_left(dues, dueFrom) if dueFrom is not None else 0
+        end = bisect_right(dues, dueTo) if dueTo is not None else len(dues)
+        return set(ids[start:end])
+
+    def order(self, sort: str) -> List[int]:
+        order = self.orders.get(sort)
+        if order is None:
+            key = SORT_KEYS[sort]
+            order = self.orders[sort] = sorted(self.rows, key=lambda id: key(self.rows[id]))
+        return order
+
+    def search(self, query: TaskQuery, sort: str = 'due', descending: bool = False) -> List[int]:
+        # Smallest sets are intersected first so a selective filter keeps
+        # the rest of the work small.
+        sets: List[Set[int]] = []
+        for word in set(tokenize(query.text)):
+            sets.append(self.matchingToken(word))
+        if query.project is not None:
+            sets.append(self.projects.get(query.project, set()))
+        if query.status is not None:
+            sets.append(self.statuses.get(query.status, set()))
+        if query.dueFrom is not None or query.dueTo is not None:
+            sets.append(self.dueBetween(query.dueFrom, query.dueTo))
+
+        order = self.order(sort)
+        if len(sets) > 0:
+            sets.sort(key=len)
+            matches = sets[0].intersection(*sets[1:])
+            order = [id for id in order if id in matches] if len(matches) < len(order) else order
+        return order[::-1] if descending else list(order)
+
+
+def unlink(index: Dict[str, Set[int]], key: str, id: int):
+    ids = index.get(key)
+    if ids is None:
+        return
+    ids.discard(id)
+    if len(ids) == 0:
+        del index[key]
@@ -0,0 +1,323 @@
+from typing import Any, Dict, List, Optional, Set
+
+from PySide6 import QtCore, QtGui, QtWidgets
+
+from src.entities import Task
+from src.taskindex import TaskIndex, TaskQuery
+from src.thumbnails import THUMBNAIL_SIZE, ThumbnailKey, ThumbnailLoader, thumbnailKey
+
+TaskIdRole = QtCore.Qt.ItemDataRole.UserRole + 1
+DueDateRole = QtCore.Qt.ItemDataRole.UserRole + 2
+ThumbnailRole = QtCore.Qt.ItemDataRole.UserRole + 3
+
+ROW_WIDTH = 380 + THUMBNAIL_SIZE.width()
+MARGIN = 8
+SPACING = 6
+BUTTON_WIDTH = 110
+UPLOAD_TEXT = "Upload files"
+DOWNLOAD_TEXT = "Download files"
+
+
+class TasksModel(QtCore.QAbstractListModel):
+    rows: List[Task]
+    positions: Dict[int, int]
+    taskIndex: TaskIndex
+
+    def __init__(self) -> None:
+        super(TasksModel, self).__init__()
+        self.rows = []
+        self.positions = {}
+        self.taskIndex = TaskIndex()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:  # type: ignore
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:  # type: ignore
+        if not index.isValid() or index.row() >= len(self.rows):
+            return None
+
+        row = self.rows[index.row()]
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return row.name
+        if role == TaskIdRole:
+            return row.id
+        if role == DueDateRole:
+            return row.dueDate
+        if role == ThumbnailRole:
+            return thumbnailKey('Task', row.id, row.updatedAt), row.image
+        return None
+
+    def task(self, index: QtCore.QModelIndex) -> Task:
+        return self.rows[index.row()]
+
+    def addTask(self, name: str, dueDate: Optional[str], id: int):
+        self.addTasks([Task(id, name, dueDate, None, None, None, None)])
+
+    def addTasks(self, tasks: List[Task]):
+        # Existing ids are updated in place, new ones are appended with a
+        # single insert notification.
+        self.taskIndex.add(tasks)
+        added: List[Task] = []
+        for task in tasks:
+            position = self.positions.get(task.id)
+            if position is None:
+                added.append(task)
+                continue
+
+            self.rows[position] = task
+            changed = self.index(position)
+            self.dataChanged.emit(changed, changed)
+
+        if len(added) == 0:
+            return
+
+        first = len(self.rows)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(added) - 1)
+        for position, task in enumerate(added, first):
+            self.rows.append(task)
+            self.positions[task.id] = position
+        self.endInsertRows()
+
+    def removeTasks(self, ids: List[int]):
+        self.taskIndex.remove(ids)
+        positions = sorted((self.positions[id] for id in ids if id in self.positions), reverse=True)
+        if len(positions) == 0:
+            return
+
+        for position in positions:
+            self.beginRemoveRows(QtCore.QModelIndex(), position, position)
+            del self.rows[position]
+            self.endRemoveRows()
+
+        self.positions = {row.id: position for position, row in enumerate(self.rows)}
+
+    def thumbnailLoaded(self, key: ThumbnailKey):
+        position = self.positions.get(key[1])
+        row = self.rows[position] if position is not None else None
+        if row is not None and thumbnailKey('Task', row.id, row.updatedAt) == key:
+            changed = self.index(position)  # type: ignore
+            self.dataChanged.emit(changed, changed, [ThumbnailRole])
+
+    def ids(self) -> Set[int]:
+        return set(self.positions)
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.positions = {}
+        self.taskIndex.clear()
+        self.endResetModel()
+
+
+class TaskFilterModel(QtCore.QAbstractListModel):
+    # The tasks of `source` that match `query`, in `sort` order, as answered
+    # by the source's TaskIndex. Inserts and edits are coalesced into one
+    # refresh per event-loop tick; removed rows leave `order` before the
+    # source drops them, and thumbnail updates are passed straight on.
+    source: TasksModel
+    query: TaskQuery
+    sort: str
+    descending: bool
+    order: List[int]
+    filterPositions: Dict[int, int]
+    refreshTimer: QtCore.QTimer
+
+    def __init__(self, source: TasksModel) -> None:
+        super(TaskFilterModel, self).__init__()
+        self.source = source
+        self.query = TaskQuery()
+        self.sort = 'due'
+        self.descending = False
+        self.order = []
+        self.filterPositions = {}
+
+        self.refreshTimer = QtCore.QTimer(self)
+        self.refreshTimer.setSingleShot(True)
+        self.refreshTimer.setInterval(0)
+        self.refreshTimer.timeout.connect(self.refresh)
+
+        source.rowsInserted.connect(self.refreshTimer.start)
+        source.rowsAboutToBeRemoved.connect(self.sourceRemoving)
+        source.modelReset.connect(self.refresh)
+        source.dataChanged.connect(self.sourceChanged)
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:  # type: ignore
+        return 0 if parent.isValid() else len(self.order)
+
+    def data(self, index: QtCore.QModelIndex, role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:  # type: ignore
+        position = self.sourcePosition(index)
+        if position is None:
+            return None
+        return self.source.data(self.source.index(position), role)
+
+    def task(self, index: QtCore.QModelIndex) -> Optional[Task]:
+        position = self.sourcePosition(index)
+        return self.source.rows[position] if position is not None else None
+
+    def sourcePosition(self, index: QtCore.QModelIndex) -> Optional[int]:
+        if not index.isValid() or index.row() >= len(self.order):
+            return None
+        return self.source.positions.get(self.order[index.row()])
+
+    def setQuery(self, query: TaskQuery):
+        self.query = query
+        self.refresh()
+
+    def setSort(self, sort: str, descending: bool = False):
+        self.sort = sort
+        self.descending = descending
+        self.refresh()
+
+    @QtCore.Slot()
+    def refresh(self):
+        self.refreshTimer.stop()
+        self.beginResetModel()
+        self.order = self.source.taskIndex.search(self.query, self.sort, self.descending)
+        self.filterPositions = {id: position for position, id in enumerate(self.order)}
+        self.endResetModel()
+
+    def sourceRemoving(self, parent: QtCore.QModelIndex, first: int, last: int):
+        # Runs before the source forgets the rows, so `order` never refers to
+        # a task the source no longer has.
+        removed = set(row.id for row in self.source.rows[first:last + 1])
+        positions = sorted((self.filterPositions[id] for id in removed if id in self.filterPositions), reverse=True)
+        if len(positions) == 0:
+            return
+
+        for position in positions:
+            self.beginRemoveRows(QtCore.QModelIndex(), position, position)
+            del self.order[position]
+            self.endRemoveRows()
+        self.filterPositions = {id: position for position, id in enumerate(self.order)}
+
+    def sourceChanged(self, topLeft: QtCore.QModelIndex, bottomRight: QtCore.QModelIndex, roles: List[int] = []):
+        if list(roles) != [ThumbnailRole]:
+            self.refreshTimer.start()
+            return
+
+        position = self.filterPositions.get(self.source.rows[topLeft.row()].id)
+        if position is not None:
+            changed = self.index(position)
+            self.dataChanged.emit(changed, changed, [ThumbnailRole])
+
+
+class TaskDelegate(QtWidgets.QStyledItemDelegate):
+    # Paints a task row (thumbnail, name, due date and the two buttons)
+    # directly, so no widgets exist per row and only visible rows cost
+    # anything, thumbnails included: they are requested as rows are painted.
+    uploadClicked = QtCore.Signal(QtCore.QModelIndex)
+    downloadClicked = QtCore.Signal(QtCore.QModelIndex)
+
+    pressed: Optional[QtCore.QPersistentModelIndex]
+    pressedButton: Optional[str]
+    thumbnails: Optional[ThumbnailLoader]
+
+    def __init__(self, parent: Optional[QtCore.QObject] = None) -> None:
+        super(TaskDelegate, self).__init__(parent)
+        self.pressed = None
+        self.pressedButton = None
+        self.thumbnails = None
+
+    def buttonHeight(self, option: QtWidgets.QStyleOptionViewItem) -> int:
+        return option.fontMetrics.height() + 12  # type: ignore
+
+    def sizeHint(self, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> QtCore.QSize:
+        return QtCore.QSize(ROW_WIDTH, 2 * self.buttonHeight(option) + SPACING + 2 * MARGIN)
+
+    def buttonRects(self, option: QtWidgets.QStyleOptionViewItem) -> Dict[str, QtCore.QRect]:
+        rect: QtCore.QRect = option.rect  # type: ignore
+        height = self.buttonHeight(option)
+        left = rect.right() - MARGIN - BUTTON_WIDTH
+        top = rect.top() + MARGIN
+        return {
+            'upload': QtCore.QRect(left, top, BUTTON_WIDTH, height),
+            'download': QtCore.QRect(left, top + height + SPACING, BUTTON_WIDTH, height),
+        }
+
+    def paint(self, painter: QtGui.QPainter, option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex):
+        painter.save()
+        rect: QtCore.QRect = option.rect.adjusted(0, 0, -1, -1)  # type: ignore
+        palette: QtGui.QPalette = option.palette  # type: ignore
+        painter.setPen(palette.color(QtGui.QPalette.ColorRole.Mid))
+        painter.drawRect(rect)
+
+        buttons = self.buttonRects(option)
+        lineX = buttons['upload'].left() - SPACING
+        painter.drawLine(lineX, rect.top() + MARGIN, lineX, rect.bottom() - MARGIN)
+
+        thumbnail = QtCore.QRect(QtCore.QPoint(rect.left() + MARGIN, rect.top() + MARGIN),
+                                 THUMBNAIL_SIZE.boundedTo(QtCore.QSize(THUMBNAIL_SIZE.width(), rect.height() - 2 * MARGIN)))
+        self.paintThumbnail(painter, thumbnail, palette, index)
+
+        painter.setPen(palette.color(QtGui.QPalette.ColorRole.WindowText))
+        left = thumbnail.right() + 1 + SPACING
+        textWidth = lineX - left - MARGIN
+        metrics: QtGui.QFontMetrics = option.fontMetrics  # type: ignore
+        name = metrics.elidedText("Name: \"" + str(index.data()) + "\"",
+                                  QtCore.Qt.TextElideMode.ElideRight, textWidth)
+        due = "Due: " + str(index.data(DueDateRole))
+        painter.drawText(QtCore.QRect(left, buttons['upload'].top(), textWidth, buttons['upload'].height()),
+                         QtCore.Qt.AlignmentFlag.AlignVCenter, name)
+        painter.drawText(QtCore.QRect(left, buttons['download'].top(), textWidth, buttons['download'].height()),
+                         QtCore.Qt.AlignmentFlag.AlignVCenter, due)
+
+        for kind, text in (('upload', UPLOAD_TEXT), ('download', DOWNLOAD_TEXT)):
+            button = QtWidgets.QStyleOptionButton()
+            button.rect = buttons[kind]  # type: ignore
+            button.text = text  # type: ignore
+            button.state = QtWidgets.QStyle.StateFlag.State_Enabled  # type: ignore
+            if self.pressedButton == kind and self.pressed == QtCore.QPersistentModelIndex(index):
+                button.state |= QtWidgets.QStyle.StateFlag.State_Sunken  # type: ignore
+            else:
+                button.state |= QtWidgets.QStyle.StateFlag.State_Raised  # type: ignore
+            style = option.widget.style() if option.widget is not None else QtWidgets.QApplication.style()  # type: ignore
+            style.drawControl(QtWidgets.QStyle.ControlElement.CE_PushButton, button, painter)
+
+        painter.restore()
+
+    def paintThumbnail(self, painter: QtGui.QPainter, rect: QtCore.QRect, palette: QtGui.QPalette,
+                       index: QtCore.QModelIndex):
+        key, url = index.data(ThumbnailRole)
+        pixmap = self.thumbnails.pixmap(key, url) if self.thumbnails is not None else None
+        if pixmap is None:
+            painter.fillRect(rect, palette.color(QtGui.QPalette.ColorRole.Midlight))
+            return
+
+        size = pixmap.size().scaled(rect.size(), QtCore.Qt.AspectRatioMode.KeepAspectRatio)
+        target = QtCore.QRect(QtCore.QPoint(0, 0), size)
+        target.moveCenter(rect.center())
+        painter.drawPixmap(target, pixmap)
+
+    def buttonAt(self, option: QtWidgets.QStyleOptionViewItem, position: QtCore.QPoint) -> Optional[str]:
+        for kind, rect in self.buttonRects(option).items():
+            if rect.contains(position):
+                return kind
+        return None
+
+    def repaint(self, option: QtWidgets.QStyleOptionViewItem):
+        view = option.widget  # type: ignore
+        if isinstance(view, QtWidgets.QAbstractItemView):
+            view.viewport().update(option.rect)  # type: ignore
+
+    def editorEvent(self, event: QtCore.QEvent, model: QtCore.QAbstractItemModel,
+                    option: QtWidgets.QStyleOptionViewItem, index: QtCore.QModelIndex) -> bool:
+        if event.type() == QtCore.QEvent.Type.MouseButtonPress:
+            self.pressed = QtCore.QPersistentModelIndex(index)
+            self.pressedButton = self.buttonAt(option, event.position().toPoint())  # type: ignore
+            self.repaint(option)
+            return self.pressedButton is not None
+
+        if event.type() == QtCore.QEvent.Type.MouseButtonRelease:
+            released = self.buttonAt(option, event.position().toPoint())  # type: ignore
+            clicked = released is not None and released == self.pressedButton and \
+                self.pressed == QtCore.QPersistentModelIndex(index)
+            self.pressed = None
+            self.pressedButton = None
+            self.repaint(option)
+            if clicked and released == 'upload':
+                self.uploadClicked.emit(index)
+            elif clicked and released == 'download':
+                self.downloadClicked.emit(index)
+            return released is not None
+
+        return False
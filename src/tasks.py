@@ -1,68 +1,61 @@
+from collections import deque
 from os import getcwd
-from typing import Dict
+from typing import Any, Deque, List, Optional
 from PySide6 import QtWidgets, QtCore, QtGui
 
-from src.line import QVLine
-from src.shotgun import DownloadAllFiles, GetShotGridTasks, ShotGridLogin, ShotgridClient, UploadFiles
+from src.shotgun import DownloadAllFiles, GetShotGridTasks, ShotGridLogin, ShotgridClient, SyncTasks, UploadFiles
+from src.blobcache import BlobCache
+from src.cache import TaskCache, accountKey
+from src.scheduler import DONE, FINISHED_STATES, TransferScheduler
+from src.sync import TaskDelta
+from src.taskindex import TaskQuery
+from src.entities import Task
+from src.taskmodel import TaskDelegate, TaskFilterModel, TasksModel
+from src.thumbnails import ThumbnailLoader
 from src.toast import Toast
+from src.transfer import failures
+from src.transferqueue import TransferQueueWidget
+from src.watcher import FolderWatcher
 from src.credentials import Credentials
 
+UPLOAD_PRIORITY = 1
+ROWS_PER_TICK = 250
+SYNC_INTERVAL = 30 * 1000
+MAX_LIMIT = 10000
+SORT_CHOICES = [("Due date", 'due', False), ("Due date, latest first", 'due', True),
+                ("Name", 'name', False), ("Recently updated", 'updated', True)]
 
-class TaskWidget (QtWidgets.QFrame):
-    taskId: int
-    taskName: str
-    download = QtCore.Signal(int, str, str)
-    upload = QtCore.Signal(int, str)
-
-    def __init__(self, taskName: str, dueDate: str, taskId: int) -> None:
-        super(TaskWidget, self).__init__()
-        self.taskId = taskId
-        self.taskName = taskName
-
-        labelWidget = QtWidgets.QLabel("Name: \"" + taskName + "\"")
-        dueLabelWidget = QtWidgets.QLabel("Due: " + str(dueDate))
-
-        uploadFileButton = QtWidgets.QPushButton("Upload files")
-        uploadFileButton.clicked.connect(self.openFileDialogue)
-
-        downloadAllFilesButton = QtWidgets.QPushButton("Download files")
-        downloadAllFilesButton.clicked.connect(self.openDirectoryDialogue)
-
-        layout = QtWidgets.QGridLayout(self)
-        layout.addWidget(labelWidget, 0, 0)
-        layout.addWidget(dueLabelWidget, 1, 0)
-        layout.addWidget(QVLine(), 0, 1, 2, 1)
-        layout.addWidget(uploadFileButton, 0, 2)
-        layout.addWidget(downloadAllFilesButton, 1, 2)
-
-        self.setFixedSize(layout.sizeHint())
-        self.setFrameStyle(QtWidgets.QFrame.Shape.Box)
-
-    def openDirectoryDialogue(self):
-        cwd = getcwd()
-        dir = QtWidgets.QFileDialog.getExistingDirectory(
-            self, "Directory Selector", cwd
-        )
-        self.download.emit(self.taskId, self.taskName, dir)
 
-    def openFileDialogue(self):
-        cwd = getcwd()
-        file = QtWidgets.QFileDialog.getOpenFileName(  # type: ignore
-            self, "File Selector", cwd)
-        self.upload.emit(self.taskId, file[0])
-
-
-class TasksWidget (QtWidgets.QListWidget):
-    elements: QtWidgets.QWidget
+class TasksWidget (QtWidgets.QListView):
+    model_: TasksModel
+    filterModel: TaskFilterModel
+    delegate: TaskDelegate
+    thumbnails: ThumbnailLoader
+    watcher: FolderWatcher
     download = QtCore.Signal(int, str, str)
-    upload = QtCore.Signal(int, str)
+    upload = QtCore.Signal(int, list)
 
     def __init__(self):
         super(TasksWidget, self).__init__()
+        self.model_ = TasksModel()
+        self.filterModel = TaskFilterModel(self.model_)
+        self.watcher = FolderWatcher(self)
+        self.watcher.ready.connect(self.upload)
+        self.delegate = TaskDelegate(self)
+        self.delegate.uploadClicked.connect(self.openFileDialogue)
+        self.delegate.downloadClicked.connect(self.openDirectoryDialogue)
+        self.thumbnails = ThumbnailLoader(self)
+        self.thumbnails.loaded.connect(self.model_.thumbnailLoaded)
+        self.delegate.thumbnails = self.thumbnails
+        self.setModel(self.filterModel)
+        self.setItemDelegate(self.delegate)
+
         self.viewport().setBackgroundRole(QtGui.QPalette.ColorRole.Window)
         self.setFlow(self.Flow.LeftToRight)
         self.setWrapping(True)
         self.setMovement(self.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(self.SelectionMode.NoSelection)
 
         self.setResizeMode(self.ResizeMode.Adjust)
 
@@ -73,23 +66,178 @@ class TasksWidget (QtWidgets.QListWidget):
         self.setFrameStyle(QtWidgets.QFrame.Shape.NoFrame)
 
     def addTask(self, name: str, dueDate: str, id: int):
-        item = QtWidgets.QListWidgetItem()
-        item.setFlags(item.flags() & ~(
-            QtCore.Qt.ItemFlag.ItemIsSelectable | QtCore.Qt.ItemFlag.ItemIsEnabled))
-        self.addItem(item)
-        widget = TaskWidget(name, dueDate, id)
-        widget.download.connect(self.downloadFiles)
-        widget.upload.connect(self.uploadFiles)
-        item.setSizeHint(widget.sizeHint())
-        self.setItemWidget(item, widget)
+        self.model_.addTask(name, dueDate, id)
+
+    def addTasks(self, tasks: List[Task]):
+        self.model_.addTasks(tasks)
+
+    def removeTasks(self, ids: List[int]):
+        for id in ids:
+            self.stopWatching(id)
+        self.model_.removeTasks(ids)
+
+    def clearTasks(self):
+        for id in self.model_.ids():
+            self.stopWatching(id)
+        self.model_.clear()
+
+    def contextMenuEvent(self, event: QtGui.QContextMenuEvent):
+        index = self.indexAt(event.pos())
+        if not index.isValid():
+            return
+
+        task = self.filterModel.task(index)
+        if task is None:
+            return
+
+        taskId = task.id
+        folder = self.watcher.folderFor(taskId)
+        menu = QtWidgets.QMenu(self)
+        if folder is None:
+            menu.addAction("Watch folder...", lambda: self.openWatchDialogue(index))
+        else:
+            menu.addAction("Stop watching " + folder, lambda: self.stopWatching(taskId))
+        menu.exec(event.globalPos())
+
+    def openWatchDialogue(self, index: QtCore.QModelIndex):
+        task = self.filterModel.task(index)
+        if task is None:
+            return
+        dir = QtWidgets.QFileDialog.getExistingDirectory(
+            self, "Folder to publish from", getcwd()
+        )
+        if dir == '':
+            return
+
+        try:
+            self.watcher.watch(task.id, dir)
+        except Exception as e:
+            Toast(self).error(str(e))
+
+    def stopWatching(self, taskId: int):
+        folder = self.watcher.folderFor(taskId)
+        if folder is not None:
+            self.watcher.unwatch(folder)
+
+    @QtCore.Slot(QtCore.QModelIndex)
+    def openDirectoryDialogue(self, index: QtCore.QModelIndex):
+        task = self.filterModel.task(index)
+        if task is None:
+            return
+        cwd = getcwd()
+        dir = QtWidgets.QFileDialog.getExistingDirectory(
+            self, "Directory Selector", cwd
+        )
+        if dir == '':
+            return
 
-    @QtCore.Slot(int, str)
-    def downloadFiles(self, id: int, name: str, outDir: str):
-        self.download.emit(id, name, outDir)
+        self.download.emit(task.id, task.name, dir)
 
-    @QtCore.Slot(int, str)
-    def uploadFiles(self, id: int, path: str):
-        self.upload.emit(id, path)
+    @QtCore.Slot(QtCore.QModelIndex)
+    def openFileDialogue(self, index: QtCore.QModelIndex):
+        task = self.filterModel.task(index)
+        if task is None:
+            return
+        cwd = getcwd()
+        files = QtWidgets.QFileDialog.getOpenFileNames(  # type: ignore
+            self, "File Selector", cwd)
+        if len(files[0]) == 0:
+            return
+
+        self.upload.emit(task.id, files[0])
+
+
+class TaskFilterBar(QtWidgets.QWidget):
+    # Search, filter and sort controls for a TaskFilterModel. Everything is
+    # answered from the loaded tasks, nothing here queries the server.
+    filterModel: TaskFilterModel
+    searchEdit: QtWidgets.QLineEdit
+    projectBox: QtWidgets.QComboBox
+    statusBox: QtWidgets.QComboBox
+    dueFrom: QtWidgets.QDateEdit
+    dueTo: QtWidgets.QDateEdit
+    sortBox: QtWidgets.QComboBox
+
+    def __init__(self, filterModel: TaskFilterModel) -> None:
+        super(TaskFilterBar, self).__init__()
+        self.filterModel = filterModel
+
+        self.searchEdit = QtWidgets.QLineEdit()
+        self.searchEdit.setPlaceholderText("Search tasks")
+        self.searchEdit.setClearButtonEnabled(True)
+        self.searchEdit.textChanged.connect(self.applyFilter)
+
+        self.projectBox = QtWidgets.QComboBox()
+        self.projectBox.addItem("All projects", None)
+        self.projectBox.currentIndexChanged.connect(self.applyFilter)
+        self.statusBox = QtWidgets.QComboBox()
+        self.statusBox.addItem("All statuses", None)
+        self.statusBox.currentIndexChanged.connect(self.applyFilter)
+
+        self.dueFrom = self.dateBox()
+        self.dueTo = self.dateBox()
+
+        self.sortBox = QtWidgets.QComboBox()
+        for text, sort, descending in SORT_CHOICES:
+            self.sortBox.addItem(text, (sort, descending))
+        self.sortBox.currentIndexChanged.connect(self.applySort)
+
+        layout = QtWidgets.QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.searchEdit, 1)
+        layout.addWidget(self.projectBox)
+        layout.addWidget(self.statusBox)
+        layout.addWidget(QtWidgets.QLabel("Due"))
+        layout.addWidget(self.dueFrom)
+        layout.addWidget(QtWidgets.QLabel("to"))
+        layout.addWidget(self.dueTo)
+        layout.addWidget(self.sortBox)
+
+        filterModel.modelReset.connect(self.updateChoices)
+
+    def dateBox(self) -> QtWidgets.QDateEdit:
+        # The minimum date stands for "no limit".
+        box = QtWidgets.QDateEdit()
+        box.setCalendarPopup(True)
+        box.setDisplayFormat("yyyy-MM-dd")
+        box.setMinimumDate(QtCore.QDate(2000, 1, 1))
+        box.setSpecialValueText("Any")
+        box.setDate(box.minimumDate())
+        box.dateChanged.connect(self.applyFilter)
+        return box
+
+    def dateOf(self, box: QtWidgets.QDateEdit) -> Optional[str]:
+        if box.date() == box.minimumDate():
+            return None
+        return box.date().toString(QtCore.Qt.DateFormat.ISODate)
+
+    @QtCore.Slot()
+    def applyFilter(self):
+        self.filterModel.setQuery(TaskQuery(
+            self.searchEdit.text(), self.dateOf(self.dueFrom), self.dateOf(self.dueTo),
+            self.projectBox.currentData(), self.statusBox.currentData()))
+
+    @QtCore.Slot()
+    def applySort(self):
+        sort, descending = self.sortBox.currentData()
+        self.filterModel.setSort(sort, descending)
+
+    @QtCore.Slot()
+    def updateChoices(self):
+        taskIndex = self.filterModel.source.taskIndex
+        for box, names in ((self.projectBox, taskIndex.projectNames()),
+                           (self.statusBox, taskIndex.statusNames())):
+            if [box.itemData(position) for position in range(1, box.count())] == names:
+                continue
+
+            selected = box.currentData()
+            box.blockSignals(True)
+            while box.count() > 1:
+                box.removeItem(1)
+            for name in names:
+                box.addItem(name, name)
+            box.setCurrentIndex(max(0, box.findData(selected)) if selected is not None else 0)
+            box.blockSignals(False)
 
 
 class TasksPage(QtWidgets.QWidget):
@@ -97,13 +245,26 @@ class TasksPage(QtWidgets.QWidget):
     threadpool: QtCore.QThreadPool
     successfulLogin = QtCore.Signal(bool)
     tasks: TasksWidget
+    filterBar: TaskFilterBar
     stateLabel: QtWidgets.QLabel
-    doingIo = False
+    cache: TaskCache
+    scheduler: TransferScheduler
+    transferQueue: TransferQueueWidget
+    pendingTasks: Deque[Task]
+    insertTimer: QtCore.QTimer
+    syncTimer: QtCore.QTimer
+    syncing = False
+    transferLimit: Optional[float] = None
 
     def __init__(self):
         super(TasksPage, self).__init__()
+        self.cache = TaskCache()
         self.client = ShotgridClient()
+        self.client.cache = self.cache
+        self.client.blobs = BlobCache.fromEnvironment()
         self.threadpool = QtCore.QThreadPool()
+        self.scheduler = TransferScheduler(self.threadpool)
+        self.scheduler.finished.connect(self.transferFinished)
 
         title = QtWidgets.QLabel("Shotgrid Client")
         title.setFont(QtGui.QFont("Arial", 25))
@@ -112,68 +273,98 @@ class TasksPage(QtWidgets.QWidget):
         self.stateLabel = QtWidgets.QLabel()
         self.stateLabel.hide()
 
+        self.transferQueue = TransferQueueWidget(self.scheduler)
+
+        # Fetched tasks are inserted a slice per event-loop tick so a large
+        # task list never blocks the GUI thread.
+        self.pendingTasks = deque()
+        self.insertTimer = QtCore.QTimer(self)
+        self.insertTimer.setInterval(0)
+        self.insertTimer.timeout.connect(self.insertPendingTasks)
+
+        self.syncTimer = QtCore.QTimer(self)
+        self.syncTimer.setInterval(SYNC_INTERVAL)
+        self.syncTimer.timeout.connect(self.syncTasks)
+
         self.tasks = TasksWidget()
+        self.tasks.thumbnails.client = self.client
+        self.filterBar = TaskFilterBar(self.tasks.filterModel)
         self.tasks.download.connect(self.downloadFiles)
         self.tasks.upload.connect(self.uploadFile)
 
+        limits = QtWidgets.QHBoxLayout()
+        limits.addStretch()
+        for text, slot in (("Download limit", self.setDownloadLimit),
+                           ("Upload limit", self.setUploadLimit),
+                           ("Per transfer", self.setTransferLimit)):
+            limits.addWidget(QtWidgets.QLabel(text))
+            limits.addWidget(self.limitBox(slot))
+
         layout = QtWidgets.QVBoxLayout(self)
         layout.addWidget(title, alignment=QtCore.Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(self.stateLabel)
+        layout.addLayout(limits)
+        layout.addWidget(self.transferQueue)
+        layout.addWidget(self.filterBar)
         layout.addWidget(self.tasks)
 
+    def limitBox(self, slot: Any) -> QtWidgets.QDoubleSpinBox:
+        box = QtWidgets.QDoubleSpinBox()
+        box.setRange(0, MAX_LIMIT)
+        box.setSingleStep(0.5)
+        box.setSuffix(" MB/s")
+        box.setSpecialValueText("Unlimited")
+        box.valueChanged.connect(slot)
+        return box
+
+    @QtCore.Slot(float)
+    def setDownloadLimit(self, megabytes: float):
+        self.client.downloadLimit.setRate(megabytes * 1e6)
+
+    @QtCore.Slot(float)
+    def setUploadLimit(self, megabytes: float):
+        self.client.uploadLimit.setRate(megabytes * 1e6)
+
+    @QtCore.Slot(float)
+    def setTransferLimit(self, megabytes: float):
+        self.transferLimit = megabytes * 1e6 if megabytes > 0 else None
+        for transfer in self.scheduler.transfers.values():
+            if transfer.state not in FINISHED_STATES:
+                transfer.runnable.control.bandwidth.setRate(self.transferLimit)
+
     @QtCore.Slot(int, str)
     def downloadFiles(self, taskId: int, taskName: str, outDir: str):
-        if self.doingIo is True:
-            return Toast().error("Already performing I/O please wait until the operation is complete before performing another one.")
-
-        self.doingIo = True
-        self.stateLabel.setText("Downloading...")
-        self.stateLabel.show()
-
         promise = DownloadAllFiles(self.client, taskId, taskName, outDir)
-        promise.signals.result.connect(self.downloadFilesSuccess)
-        promise.signals.error.connect(self.downloadFilesFailure)
-        self.threadpool.start(promise)  # type: ignore
-
-    @QtCore.Slot(object)
-    def downloadFilesSuccess(self):
-        self.doingIo = False
-        self.stateLabel.hide()
-        Toast(self).notify("Download Successful!")
-
-    @QtCore.Slot(Exception)
-    def downloadFilesFailure(self, e: Exception):
-        self.doingIo = False
-        self.stateLabel.hide()
-        Toast(self).error("Download Failed: " + str(e))
-
-    @QtCore.Slot(int, str)
-    def uploadFile(self, taskId: int, filepath: str):
-        if self.doingIo is True:
-            return Toast().error("Already performing I/O please wait until the operation is complete before performing another one.")
-
-        self.doingIo = True
-        self.stateLabel.setText("Uploading...")
-        self.stateLabel.show()
-
-        promise = UploadFiles(self.client, taskId, filepath)
-        promise.signals.result.connect(self.uploadFilesSuccess)
-        promise.signals.error.connect(self.uploadFilesFailure)
-        self.threadpool.start(promise)  # type: ignore
-
-    @QtCore.Slot(object)
-    def uploadFilesSuccess(self):
-        self.doingIo = False
-        self.stateLabel.hide()
-        Toast(self).notify("Upload Successful!")
-
-    @QtCore.Slot(Exception)
-    def uploadFilesFailure(self, e: Exception):
-        self.doingIo = False
-        self.stateLabel.hide()
-        Toast(self).error("Upload Failed: " + str(e))
+        promise.control.bandwidth.setRate(self.transferLimit)
+        self.scheduler.submit(
+            'download', "Download \"" + taskName + "\"", promise)
+
+    @QtCore.Slot(int, list)
+    def uploadFile(self, taskId: int, filepaths: List[str]):
+        promise = UploadFiles(self.client, taskId, filepaths)
+        promise.control.bandwidth.setRate(self.transferLimit)
+        label = "Upload " + str(len(filepaths)) + " file(s) to task " + str(taskId)
+        self.scheduler.submit('upload', label, promise, UPLOAD_PRIORITY)
+
+    @QtCore.Slot(int)
+    def transferFinished(self, id: int):
+        transfer = self.scheduler.get(id)
+        if transfer is None or transfer.state != DONE:
+            return
+
+        failed = failures(transfer.result)
+        if len(failed) > 0:
+            Toast(self).error(
+                transfer.label + " failed for " + str(len(failed)) + " of " + str(len(transfer.result)) + " files:\n" +
+                "\n".join(result.path + ": " + str(result.error) for result in failed))
 
     def loginUser(self, credentials: Credentials):
+        self.syncTimer.stop()
+        self.pendingTasks.clear()
+        self.tasks.clearTasks()
+        self.showTasks(self.cache.loadTasks(
+            accountKey(credentials.url, credentials.username)))
+
         promise = ShotGridLogin(
             self.client,
             credentials
@@ -186,8 +377,10 @@ class TasksPage(QtWidgets.QWidget):
 
     @QtCore.Slot(object)
     def loginSuccess(self):
+        self.tasks.thumbnails.retry()
         self.stateLabel.setText("Login Successful.\nFetching current tasks.")
         promise = GetShotGridTasks(self.client)
+        promise.signals.page.connect(self.getTasksPage)
         promise.signals.result.connect(self.getTasksSuccess)
         promise.signals.error.connect(self.getTasksFailed)
         self.threadpool.start(promise)  # type: ignore
@@ -206,16 +399,53 @@ class TasksPage(QtWidgets.QWidget):
         if not isinstance(result, list):
             raise Exception()
 
-        for task in result:  # type: ignore
-            if not isinstance(task, Dict):
-                raise Exception()
+        self.stateLabel.hide()
+        self.syncTimer.start()
 
-            name: str = task["content"]
-            dueDate: str = task['due_date']
-            id: int = task['id']
-            self.tasks.addTask(name, dueDate, id)
+    @QtCore.Slot()
+    def syncTasks(self):
+        if self.syncing:
+            return
 
-        self.stateLabel.hide()
+        self.syncing = True
+        promise = SyncTasks(self.client, self.tasks.model_.ids())
+        promise.signals.result.connect(self.syncTasksSuccess)
+        promise.signals.error.connect(self.syncTasksFailed)
+        self.threadpool.start(promise)  # type: ignore
+
+    @QtCore.Slot(object)
+    def syncTasksSuccess(self, delta: TaskDelta):
+        self.syncing = False
+        self.showTasks(delta.updated)
+        self.tasks.removeTasks(delta.removed)
+
+    @QtCore.Slot(Exception)
+    def syncTasksFailed(self, e: Exception):
+        # A missed poll is retried on the next tick, so it is not worth a dialog.
+        self.syncing = False
+
+    @QtCore.Slot(object)
+    def getTasksPage(self, page: object):
+        if not isinstance(page, list):
+            raise Exception()
+
+        self.showTasks(page)  # type: ignore
+
+    def showTasks(self, tasks: List[Task]):
+        self.pendingTasks.extend(tasks)
+        self.insertPendingTasks()
+
+    @QtCore.Slot()
+    def insertPendingTasks(self):
+        batch: List[Task] = []
+        while len(self.pendingTasks) > 0 and len(batch) < ROWS_PER_TICK:
+            batch.append(self.pendingTasks.popleft())
+        self.tasks.addTasks(batch)
+
+        if len(self.pendingTasks) > 0:
+            self.insertTimer.start()
+        else:
+            self.insertTimer.stop()
 
     @QtCore.Slot(Exception)
     def getTasksFailed(self, e: Exception):
@@ -0,0 +1,204 @@
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import datetime
+from itertools import count
+from threading import Lock
+from typing import Any, Optional, Set, Tuple
+
+from PySide6 import QtCore, QtGui
+
+from src.client import ShotgridClient
+from src.shotgun import Signals
+
+THUMBNAIL_DIR = ".thumbnails"
+THUMBNAIL_SIZE = QtCore.QSize(96, 54)
+MEMORY_LIMIT = 16 * 1024 * 1024
+DISK_LIMIT = 256 * 1024 * 1024
+LOAD_THREADS = 4
+
+# (entity type, id, updated_at) so an updated entity gets a new thumbnail.
+ThumbnailKey = Tuple[str, int, Optional[str]]
+
+
+def thumbnailKey(entityType: str, id: int, updatedAt: Optional[datetime]) -> ThumbnailKey:
+    return entityType, id, str(updatedAt) if updatedAt is not None else None
+
+
+class DiskCache:
+    # Image files named after their key. Reads refresh a file's mtime and
+    # writes evict the least recently used files beyond `limit` bytes.
+    path: str
+    limit: int
+    total: Optional[int]
+    lock: Lock
+
+    def __init__(self, path: str = THUMBNAIL_DIR, limit: int = DISK_LIMIT) -> None:
+        self.path = path
+        self.limit = limit
+        self.total = None
+        self.lock = Lock()
+
+    def filename(self, key: ThumbnailKey) -> str:
+        return os.path.join(self.path, hashlib.sha1(repr(key).encode()).hexdigest())
+
+    def get(self, key: ThumbnailKey) -> Optional[bytes]:
+        filename = self.filename(key)
+        try:
+            with open(filename, 'rb') as file:
+                data = file.read()
+            os.utime(filename)
+            return data
+        except OSError:
+            return None
+
+    def put(self, key: ThumbnailKey, data: bytes):
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            filename = self.filename(key)
+            with open(filename + '.tmp', 'wb') as file:
+                file.write(data)
+            os.replace(filename + '.tmp', filename)
+
+            if self.total is None:
+                self.total = sum(entry.stat().st_size for entry in os.scandir(self.path))
+            else:
+                self.total += len(data)
+            if self.total > self.limit:
+                self.evict()
+
+    def evict(self):
+        entries = sorted(os.scandir(self.path), key=lambda entry: entry.stat().st_mtime)
+        self.total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.total <= self.limit * 3 // 4:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.total -= size
+            except OSError:
+                pass
+
+
+class MemoryCache:
+    # Decoded pixmaps, least recently used first, bounded by their size in bytes.
+    pixmaps: 'OrderedDict[ThumbnailKey, QtGui.QPixmap]'
+
+    def __init__(self, limit: int = MEMORY_LIMIT) -> None:
+        self.limit = limit
+        self.total = 0
+        self.pixmaps = OrderedDict()
+
+    @staticmethod
+    def cost(pixmap: QtGui.QPixmap) -> int:
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    def get(self, key: ThumbnailKey) -> Optional[QtGui.QPixmap]:
+        pixmap = self.pixmaps.get(key)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(key)
+        return pixmap
+
+    def put(self, key: ThumbnailKey, pixmap: QtGui.QPixmap):
+        old = self.pixmaps.pop(key, None)
+        if old is not None:
+            self.total -= self.cost(old)
+        self.pixmaps[key] = pixmap
+        self.total += self.cost(pixmap)
+        while self.total > self.limit and len(self.pixmaps) > 1:
+            _, evicted = self.pixmaps.popitem(last=False)
+            self.total -= self.cost(evicted)
+
+
+class LoadThumbnail(QtCore.QRunnable):
+    client: ShotgridClient
+    disk: DiskCache
+    key: ThumbnailKey
+    url: str
+    signals: Signals
+
+    def __init__(self, client: ShotgridClient, disk: DiskCache, key: ThumbnailKey, url: str) -> None:
+        super(LoadThumbnail, self).__init__()
+        self.client = client
+        self.disk = disk
+        self.key = key
+        self.url = url
+        self.signals = Signals()
+
+    @QtCore.Slot()
+    def run(self):
+        try:
+            data = self.disk.get(self.key)
+            if data is None:
+                data = self.client.fetchThumbnail(self.url)
+                # Shotgrid serves a placeholder while it is still generating
+                # the thumbnail, which must not be kept.
+                if '/transient/' not in self.url:
+                    self.disk.put(self.key, data)
+
+            image = QtGui.QImage()
+            if not image.loadFromData(data):
+                raise Exception("Could not decode the thumbnail of " + str(self.key))
+            image = image.scaled(THUMBNAIL_SIZE, QtCore.Qt.AspectRatioMode.KeepAspectRatio,
+                                 QtCore.Qt.TransformationMode.SmoothTransformation)
+            self.signals.result.emit((self.key, image))
+        except Exception as e:
+            self.signals.error.emit(e)
+        finally:
+            self.client.release()
+
+
+class ThumbnailLoader(QtCore.QObject):
+    # Hands out thumbnails from memory and loads missing ones on a small
+    # thread pool, emitting `loaded(key)` when one arrives. The most recent
+    # requests (what is on screen now) are loaded first.
+    loaded = QtCore.Signal(object)
+
+    client: Optional[ShotgridClient]
+    memory: MemoryCache
+    disk: DiskCache
+    threadpool: QtCore.QThreadPool
+    loading: Set[ThumbnailKey]
+    failed: Set[ThumbnailKey]
+
+    def __init__(self, parent: Optional[QtCore.QObject] = None) -> None:
+        super(ThumbnailLoader, self).__init__(parent)
+        self.client = None
+        self.memory = MemoryCache()
+        self.disk = DiskCache()
+        self.threadpool = QtCore.QThreadPool(self)
+        self.threadpool.setMaxThreadCount(LOAD_THREADS)
+        self.loading = set()
+        self.failed = set()
+        self.requests = count()
+
+    def pixmap(self, key: ThumbnailKey, url: Optional[str]) -> Optional[QtGui.QPixmap]:
+        pixmap = self.memory.get(key)
+        if pixmap is not None or url is None or self.client is None:
+            return pixmap
+        if key in self.failed or key in self.loading:
+            return None
+
+        runnable = LoadThumbnail(self.client, self.disk, key, url)
+        runnable.signals.result.connect(self.thumbnailLoaded)
+        runnable.signals.error.connect(lambda e: self.thumbnailFailed(key))
+        self.loading.add(key)
+        self.threadpool.start(runnable, next(self.requests) % 2 ** 31)
+        return None
+
+    @QtCore.Slot(object)
+    def thumbnailLoaded(self, result: Any):
+        key, image = result
+        self.loading.discard(key)
+        self.memory.put(key, QtGui.QPixmap.fromImage(image))
+        self.loaded.emit(key)
+
+    def retry(self):
+        # Thumbnails that failed, e.g. because nobody was logged in yet, are
+        # requested again the next time they are painted.
+        self.failed.clear()
+
+    def thumbnailFailed(self, key: ThumbnailKey):
+        self.loading.discard(key)
+        self.failed.add(key)
@@ -0,0 +1,218 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Event, Lock, local
+from typing import Any, Callable, Deque, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from src.bandwidth import TokenBucket
+from src.transport import Slot, isTransient, withRetries
+
+RATE_WINDOW = 5.0
+
+
+class TransferCancelled(Exception):
+    def __init__(self):
+        super(TransferCancelled, self).__init__("Transfer was cancelled")
+
+
+@dataclass
+class ProgressSnapshot:
+    files: int
+    filesDone: int
+    total: Optional[int]
+    done: int
+    rate: float
+
+    @property
+    def fraction(self) -> Optional[float]:
+        return min(1.0, self.done / self.total) if self.total else None
+
+    @property
+    def eta(self) -> Optional[float]:
+        if self.total is None or self.rate <= 0:
+            return None
+        return max(0, self.total - self.done) / self.rate
+
+
+class TransferProgress:
+    # Byte-level progress of one transfer. Workers record the bytes each file
+    # has on disk (so a retried or resumed file is never counted twice) and
+    # the bytes actually moved; readers poll `snapshot()`, whose rate is
+    # averaged over the last RATE_WINDOW seconds of polls.
+    sizes: Dict[str, Optional[int]]
+    done: Dict[str, int]
+    finished: Dict[str, bool]
+    transferred: int
+    samples: Deque[Tuple[float, int]]
+    lock: Lock
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self.clock = clock
+        self.sizes = {}
+        self.done = {}
+        self.finished = {}
+        self.transferred = 0
+        self.samples = deque()
+        self.lock = Lock()
+
+    def plan(self, sizes: Mapping[str, Optional[int]]):
+        with self.lock:
+            self.sizes.update(sizes)
+
+    def expect(self, path: str, size: int):
+        with self.lock:
+            if self.sizes.get(path) is None:
+                self.sizes[path] = size
+
+    def update(self, path: str, done: int, transferred: int = 0):
+        with self.lock:
+            self.done[path] = done
+            self.transferred += transferred
+
+    def finish(self, path: str):
+        with self.lock:
+            self.finished[path] = True
+            size = self.sizes.get(path)
+            if size is not None:
+                # Uploads only report whole files, so their bytes land here.
+                self.transferred += max(0, size - self.done.get(path, 0))
+                self.done[path] = size
+
+    def snapshot(self) -> ProgressSnapshot:
+        with self.lock:
+            now = self.clock()
+            self.samples.append((now, self.transferred))
+            while len(self.samples) > 2 and now - self.samples[0][0] > RATE_WINDOW:
+                self.samples.popleft()
+            since, before = self.samples[0]
+            rate = (self.transferred - before) / (now - since) if now > since else 0.0
+
+            sizes = list(self.sizes.values())
+            total = sum(size for size in sizes if size is not None) \
+                if len(sizes) > 0 and None not in sizes else None
+            return ProgressSnapshot(len(self.sizes), len(self.finished), total,
+                                    sum(self.done.values()), rate)
+
+
+class TransferControl:
+    # Shared between the GUI thread and the workers of one transfer. Workers
+    # call `checkpoint()` between units of work (files, chunks) which blocks
+    # while the transfer is paused and raises once it has been cancelled.
+    # `bandwidth` limits this transfer across all of its workers and
+    # `progress` is how far it has got. A worker's limiter slot is given
+    # back for as long as it waits in a paused checkpoint.
+    cancelled: Event
+    running: Event
+    bandwidth: TokenBucket
+    progress: TransferProgress
+    slots: local
+
+    def __init__(self, rate: Optional[float] = None):
+        self.cancelled = Event()
+        self.running = Event()
+        self.running.set()
+        self.bandwidth = TokenBucket(rate)
+        self.progress = TransferProgress()
+        self.slots = local()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.running.set()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    @property
+    def paused(self) -> bool:
+        return not self.running.is_set()
+
+    @contextmanager
+    def holding(self, slot: Slot) -> Iterator[None]:
+        self.slots.slot = slot
+        try:
+            yield
+        finally:
+            self.slots.slot = None
+
+    def checkpoint(self):
+        slot: Optional[Slot] = getattr(self.slots, 'slot', None)
+        while not self.running.is_set():
+            if slot is not None:
+                slot.give()
+            self.running.wait()
+            if slot is not None and not self.cancelled.is_set():
+                slot.take()
+        if self.cancelled.is_set():
+            raise TransferCancelled()
+
+
+@dataclass
+class TransferResult:
+    path: str
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def failures(results: Sequence[TransferResult]) -> List[TransferResult]:
+    return [result for result in results if not result.ok]
+
+
+def runJob(client: Any, work: Callable[[Any, str, Any], None], path: str, payload: Any,
+           control: Optional[TransferControl] = None,
+           retryable: Callable[[BaseException], bool] = isTransient) -> TransferResult:
+    # Failures `retryable` accepts are retried with backoff and every attempt
+    # waits for a slot of the client's adaptive in-flight limit. Any transient
+    # failure suits downloads, which resume where the last attempt stopped;
+    # work that cannot safely run twice should only retry when the server
+    # turned it away (isRejected).
+    limiter = client.limiter
+
+    def attempt():
+        if control is None:
+            with limiter.slot():
+                work(client, path, payload)
+            return
+
+        control.checkpoint()
+        with limiter.slot(control.cancelled) as slot, control.holding(slot):
+            control.checkpoint()
+            work(client, path, payload)
+
+    try:
+        withRetries(attempt, retryable=retryable, onThrottled=limiter.throttled, control=control)
+        limiter.succeeded()
+        return TransferResult(path)
+    except TransferCancelled:
+        raise
+    except Exception as e:
+        return TransferResult(path, str(e))
+
+
+def runConcurrently(client: Any, jobs: Sequence[Tuple[str, Any]],
+                    work: Callable[[Any, str, Any], None], workers: int,
+                    control: Optional[TransferControl] = None,
+                    retryable: Callable[[BaseException], bool] = isTransient) -> List[TransferResult]:
+    # Each job is a (path, payload) pair handed to `work(client, path, payload)`.
+    # Worker threads use their own pooled connection of `client` and give it
+    # back after every job so that waiting threads elsewhere can have it.
+    if workers <= 1 or len(jobs) <= 1:
+        return [runJob(client, work, path, payload, control, retryable) for path, payload in jobs]
+
+    def runOne(job: Tuple[str, Any]) -> TransferResult:
+        path, payload = job
+        try:
+            return runJob(client, work, path, payload, control, retryable)
+        finally:
+            client.release()
+
+    client.release()
+    with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        return list(executor.map(runOne, jobs))
@@ -0,0 +1,168 @@
+from typing import Dict, Optional
+
+from PySide6 import QtCore, QtWidgets
+
+from src.scheduler import DONE, FINISHED_STATES, PAUSED, RUNNING, TransferScheduler
+from src.transfer import ProgressSnapshot
+
+PROGRESS_INTERVAL = 100
+
+
+def megabytes(count: float) -> str:
+    return "%.1f MB" % (count / 1e6)
+
+
+def duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "%d:%02d:%02d" % (hours, minutes, seconds) if hours > 0 else "%d:%02d" % (minutes, seconds)
+
+
+def describe(snapshot: ProgressSnapshot) -> str:
+    size = megabytes(snapshot.done)
+    if snapshot.total is not None:
+        size += " of " + megabytes(snapshot.total)
+    return "%s · %s/s · %d/%d files · ETA %s" % (
+        size, megabytes(snapshot.rate), snapshot.filesDone, snapshot.files, duration(snapshot.eta))
+
+
+class TransferQueueWidget(QtWidgets.QWidget):
+    scheduler: TransferScheduler
+    tree: QtWidgets.QTreeWidget
+    items: Dict[int, QtWidgets.QTreeWidgetItem]
+    pauseButtons: Dict[int, QtWidgets.QPushButton]
+    progressBars: Dict[int, QtWidgets.QProgressBar]
+    timer: QtCore.QTimer
+
+    def __init__(self, scheduler: TransferScheduler) -> None:
+        super(TransferQueueWidget, self).__init__()
+        self.scheduler = scheduler
+        self.items = {}
+        self.pauseButtons = {}
+        self.progressBars = {}
+
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setColumnCount(5)
+        self.tree.setHeaderLabels(["Transfer", "Status", "Progress", "", ""])
+        self.tree.setRootIsDecorated(False)
+        self.tree.header().setSectionResizeMode(
+            0, QtWidgets.QHeaderView.ResizeMode.Stretch)
+        self.tree.setMaximumHeight(140)
+
+        clearButton = QtWidgets.QPushButton("Clear finished")
+        clearButton.clicked.connect(self.clearFinished)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.tree)
+        layout.addWidget(clearButton, alignment=QtCore.Qt.AlignmentFlag.AlignRight)
+
+        # Workers only record progress; it is read here at a fixed rate for
+        # all transfers at once, so the event loop never sees per-chunk updates.
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(PROGRESS_INTERVAL)
+        self.timer.timeout.connect(self.refreshProgress)
+
+        self.scheduler.changed.connect(self.transferChanged)
+        self.hide()
+
+    @QtCore.Slot(int)
+    def transferChanged(self, id: int):
+        transfer = self.scheduler.get(id)
+        if transfer is None:
+            return
+
+        item = self.items.get(id)
+        if item is None:
+            item = self.addTransfer(id, transfer.label)
+
+        status = transfer.state
+        if transfer.error is not None:
+            status += ": " + transfer.error
+        item.setText(1, status)
+        item.setToolTip(1, status)
+
+        pauseButton = self.pauseButtons[id]
+        pauseButton.setText("Resume" if transfer.state == PAUSED else "Pause")
+        finished = transfer.state in FINISHED_STATES
+        pauseButton.setEnabled(not finished)
+        self.tree.itemWidget(item, 4).setEnabled(not finished)  # type: ignore
+        self.refreshProgress()
+        self.show()
+
+    def addTransfer(self, id: int, label: str) -> QtWidgets.QTreeWidgetItem:
+        item = QtWidgets.QTreeWidgetItem([label, ""])
+        self.tree.addTopLevelItem(item)
+        self.items[id] = item
+
+        progressBar = QtWidgets.QProgressBar()
+        progressBar.setRange(0, 1000)
+        self.progressBars[id] = progressBar
+
+        pauseButton = QtWidgets.QPushButton("Pause")
+        pauseButton.clicked.connect(lambda: self.togglePause(id))
+        self.pauseButtons[id] = pauseButton
+
+        cancelButton = QtWidgets.QPushButton("Cancel")
+        cancelButton.clicked.connect(lambda: self.scheduler.cancel(id))
+
+        self.tree.setItemWidget(item, 2, progressBar)
+        self.tree.setItemWidget(item, 3, pauseButton)
+        self.tree.setItemWidget(item, 4, cancelButton)
+        return item
+
+    @QtCore.Slot()
+    def refreshProgress(self):
+        running = False
+        for id, progressBar in self.progressBars.items():
+            transfer = self.scheduler.get(id)
+            if transfer is None or not transfer.started:
+                continue
+
+            snapshot = transfer.runnable.control.progress.snapshot()
+            fraction = snapshot.fraction
+            if fraction is None and snapshot.files > 0:
+                fraction = snapshot.filesDone / snapshot.files
+            if transfer.state == DONE:
+                fraction = 1.0
+
+            if fraction is None and transfer.state == RUNNING:
+                progressBar.setRange(0, 0)
+            else:
+                progressBar.setRange(0, 1000)
+                progressBar.setValue(int(1000 * (fraction or 0)))
+            progressBar.setToolTip(describe(snapshot))
+
+            if transfer.state == RUNNING:
+                running = True
+                status = transfer.state + " · " + describe(snapshot)
+                self.items[id].setText(1, status)
+                self.items[id].setToolTip(1, status)
+
+        if running and not self.timer.isActive():
+            self.timer.start()
+        elif not running:
+            self.timer.stop()
+
+    def togglePause(self, id: int):
+        transfer = self.scheduler.get(id)
+        if transfer is None:
+            return
+
+        if transfer.state == PAUSED:
+            self.scheduler.resume(id)
+        else:
+            self.scheduler.pause(id)
+
+    @QtCore.Slot()
+    def clearFinished(self):
+        for id in self.scheduler.clearFinished():
+            item = self.items.pop(id)
+            self.pauseButtons.pop(id)
+            self.progressBars.pop(id)
+            self.tree.takeTopLevelItem(self.tree.indexOfTopLevelItem(item))
+
+        if len(self.items) == 0:
+            self.hide()
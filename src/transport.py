@@ -0,0 +1,274 @@
+import http.client
+import random
+import socket
+import time
+import urllib.error
+from contextlib import contextmanager
+from dataclasses import dataclass
+from threading import Condition, Event, Lock
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, TypeVar
+
+T = TypeVar('T')
+
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+THROTTLE_STATUS = {429, 503}
+IDEMPOTENT_METHODS = {'info', 'read', 'get_session_token', 'schema_read', 'schema_entity_read',
+                      'schema_field_read', 'summarize', 'text_search'}
+
+MIN_IN_FLIGHT = 1
+INITIAL_IN_FLIGHT = 4
+MAX_IN_FLIGHT = 12
+DECREASE_COOLDOWN = 2.0
+LATENCY_TOLERANCE = 3.0
+LATENCY_FLOOR = 0.05
+LATENCY_SMOOTHING = 0.2
+BASELINE_DRIFT = 1.01
+CANCEL_POLL = 0.1
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = 6
+    base: float = 0.5
+    cap: float = 30.0
+
+    def delay(self, attempt: int, retryAfter: Optional[float] = None) -> float:
+        # "Full jitter": a random wait up to the exponential bound, so clients
+        # throttled at the same moment do not come back at the same moment.
+        wait = random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+        if retryAfter is not None:
+            wait = max(wait, min(self.cap, retryAfter))
+        return wait
+
+
+DEFAULT_POLICY = RetryPolicy()
+
+
+def causes(error: BaseException) -> Iterator[BaseException]:
+    seen = set()
+    current: Optional[BaseException] = error
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        yield current
+        current = current.__cause__ or current.__context__
+
+
+def statusOf(error: BaseException) -> Optional[int]:
+    # urllib's HTTPError has `code`, shotgun_api3's ProtocolError `errcode`.
+    for name in ('code', 'errcode'):
+        status = getattr(error, name, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def isTransient(error: BaseException) -> bool:
+    for cause in causes(error):
+        status = statusOf(cause)
+        if status is not None:
+            return status in TRANSIENT_STATUS
+        if isinstance(cause, (TimeoutError, socket.timeout, ConnectionError,
+                              http.client.HTTPException, urllib.error.URLError)):
+            return True
+    return False
+
+
+def isThrottled(error: BaseException) -> bool:
+    for cause in causes(error):
+        if statusOf(cause) in THROTTLE_STATUS or isinstance(cause, (TimeoutError, socket.timeout)):
+            return True
+    return False
+
+
+def isRejected(error: BaseException) -> bool:
+    return any(statusOf(cause) in THROTTLE_STATUS for cause in causes(error))
+
+
+def retryAfter(error: BaseException) -> Optional[float]:
+    for cause in causes(error):
+        headers = getattr(cause, 'headers', None)
+        value = headers.get('Retry-After') if headers is not None else None
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                return None
+    return None
+
+
+def withRetries(operation: Callable[[], T], policy: RetryPolicy = DEFAULT_POLICY,
+                retryable: Callable[[BaseException], bool] = isTransient,
+                onThrottled: Optional[Callable[[], None]] = None, control: Any = None) -> T:
+    # `control` is a TransferControl: waiting between attempts ends early when
+    # the transfer is cancelled and its checkpoint raises.
+    attempt = 0
+    while True:
+        try:
+            return operation()
+        except Exception as e:
+            attempt += 1
+            if attempt >= policy.attempts or not retryable(e):
+                raise
+            if onThrottled is not None and isThrottled(e):
+                onThrottled()
+
+            wait = policy.delay(attempt, retryAfter(e))
+            if control is not None:
+                control.cancelled.wait(wait)
+                control.checkpoint()
+            else:
+                time.sleep(wait)
+
+
+class AimdLimiter:
+    # Caps the number of transfers in flight across a client. Every `limit`
+    # successful transfers raise the limit by one (additive increase); a
+    # throttling response, a timeout or request latency far above the best
+    # seen halves it (multiplicative decrease), at most once per `cooldown`
+    # seconds so one burst of errors only counts once.
+    limit: float
+    inFlight: int
+    baselines: Dict[Hashable, float]
+    smoothed: Dict[Hashable, float]
+    condition: Condition
+    latencyLock: Lock
+
+    def __init__(self, initial: int = INITIAL_IN_FLIGHT, minimum: int = MIN_IN_FLIGHT,
+                 maximum: int = MAX_IN_FLIGHT, cooldown: float = DECREASE_COOLDOWN,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self.clock = clock
+        self.inFlight = 0
+        self.lastDecrease = -cooldown
+        self.baselines = {}
+        self.smoothed = {}
+        self.condition = Condition()
+        self.latencyLock = Lock()
+
+    def acquire(self, cancelled: Optional[Event] = None) -> bool:
+        # Returns False, without a slot, once `cancelled` is set.
+        with self.condition:
+            while self.inFlight >= int(self.limit):
+                if cancelled is not None and cancelled.is_set():
+                    return False
+                self.condition.wait(CANCEL_POLL if cancelled is not None else None)
+            self.inFlight += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.inFlight -= 1
+            self.condition.notify()
+
+    @contextmanager
+    def slot(self, cancelled: Optional[Event] = None) -> Iterator['Slot']:
+        slot = Slot(self, cancelled)
+        slot.take()
+        try:
+            yield slot
+        finally:
+            slot.give()
+
+    def succeeded(self):
+        with self.condition:
+            if self.limit < self.maximum:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+                self.condition.notify_all()
+
+    def throttled(self):
+        with self.condition:
+            now = self.clock()
+            if now - self.lastDecrease < self.cooldown:
+                return
+            self.lastDecrease = now
+            self.limit = max(float(self.minimum), self.limit / 2)
+
+    def observeLatency(self, key: Hashable, seconds: float):
+        # Latencies are compared per request kind (`key`), since a large
+        # query is legitimately slower than a single lookup.
+        with self.latencyLock:
+            baseline = min(self.baselines.get(key, seconds) * BASELINE_DRIFT, seconds)
+            self.baselines[key] = baseline
+            smoothed = self.smoothed.get(key, seconds)
+            smoothed += LATENCY_SMOOTHING * (seconds - smoothed)
+            self.smoothed[key] = smoothed
+
+        if smoothed > LATENCY_FLOOR and smoothed > LATENCY_TOLERANCE * baseline:
+            self.throttled()
+
+
+class Slot:
+    # One in-flight slot of an AimdLimiter. A paused transfer gives its slot
+    # back and takes one again when it resumes, so it does not hold up
+    # transfers that are still running.
+    limiter: AimdLimiter
+    cancelled: Optional[Event]
+    held: bool
+
+    def __init__(self, limiter: AimdLimiter, cancelled: Optional[Event] = None) -> None:
+        self.limiter = limiter
+        self.cancelled = cancelled
+        self.held = False
+
+    def take(self):
+        if not self.held:
+            self.held = self.limiter.acquire(self.cancelled)
+
+    def give(self):
+        if self.held:
+            self.held = False
+            self.limiter.release()
+
+
+def guardConnection(sg: Any, limiter: AimdLimiter, policy: RetryPolicy = DEFAULT_POLICY) -> Any:
+    # Retries the RPCs of a Shotgun connection. Read-only methods are retried
+    # on any transient failure; writes only when the server turned them away
+    # (429 / 503) so a create is never repeated after it may have happened.
+    callRpc = sg._call_rpc
+
+    def guardedCallRpc(method: str, params: Any, *args: Any, **kwargs: Any) -> Any:
+        def attempt() -> Any:
+            started = time.perf_counter()
+            result = callRpc(method, params, *args, **kwargs)
+            entityType = params.get('type') if isinstance(params, dict) else None
+            limiter.observeLatency((method, entityType), time.perf_counter() - started)
+            return result
+
+        retryable = isTransient if method in IDEMPOTENT_METHODS else isRejected
+        return withRetries(attempt, policy, retryable, limiter.throttled)
+
+    sg._call_rpc = guardedCallRpc
+    guardForms(sg, limiter, policy)
+    return sg
+
+
+def guardForms(sg: Any, limiter: AimdLimiter, policy: RetryPolicy = DEFAULT_POLICY):
+    # Upload links, upload info and upload completion are form posts that
+    # bypass _call_rpc. shotgun_api3's `_send_form` turns every HTTP error
+    # into a ShotgunError without its status (newer versions only after
+    # retrying with no regard for throttling), so it is replaced by the same
+    # request, retried here when the server turned it away. Forms carrying
+    # an open file cannot be sent twice and are not retried.
+    from shotgun_api3.shotgun import FormPostHandler, ShotgunError  # type: ignore
+
+    def guardedSendForm(url: str, params: Dict[str, Any]) -> str:
+        params.update(sg._auth_params())
+
+        def attempt() -> str:
+            with sg._build_opener(FormPostHandler).open(url, params) as response:
+                result = response.read()
+            return result.decode('utf-8') if isinstance(result, bytes) else result
+
+        streaming = any(hasattr(value, 'read') for value in params.values())
+        try:
+            return withRetries(attempt, policy, (lambda e: False) if streaming else isRejected,
+                               limiter.throttled)
+        except urllib.error.HTTPError as e:
+            if e.code == 500:
+                raise ShotgunError("Server encountered an internal error.\n%s\n%s" % (url, e)) from e
+            raise ShotgunError("Unanticipated error occurred %s" % e) from e
+
+    sg._send_form = guardedSendForm
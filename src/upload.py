@@ -0,0 +1,44 @@
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Any, Dict, List
+
+from src.bandwidth import currentBuckets, limited
+
+PART_WORKERS = 4
+
+
+def readPart(path: str, offset: int, size: int) -> bytes:
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        return file.read(size)
+
+
+def parallelMultipartUpload(sg: Any, path: str, uploadInfo: Dict[str, Any], workers: int = PART_WORKERS):
+    # Same protocol as shotgun_api3's serial `_multipart_upload_file_to_storage`,
+    # but the parts are sent to storage concurrently. At most `workers` parts
+    # are held in memory at once.
+    filename = os.path.basename(path)
+    contentType = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    fileSize = os.path.getsize(path)
+    chunkSize = sg._MULTIPART_UPLOAD_CHUNK_SIZE
+    buckets = currentBuckets()
+
+    def uploadPart(partNumber: int) -> str:
+        offset = (partNumber - 1) * chunkSize
+        data = readPart(path, offset, min(chunkSize, fileSize - offset))
+        partUrl = sg._get_upload_part_link(uploadInfo, filename, partNumber)
+        with limited(buckets):
+            return sg._upload_data_to_storage(BytesIO(data), contentType, len(data), partUrl)
+
+    parts = range(1, (fileSize + chunkSize - 1) // chunkSize + 1)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        etags: List[str] = list(executor.map(uploadPart, parts))
+
+    sg._complete_multipart_upload(uploadInfo, filename, etags)
+
+
+def enableParallelMultipart(sg: Any, workers: int = PART_WORKERS):
+    sg._multipart_upload_file_to_storage = lambda path, uploadInfo: parallelMultipartUpload(
+        sg, path, uploadInfo, workers)
@@ -0,0 +1,142 @@
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from PySide6 import QtCore
+
+from src.download import PARTIAL_SUFFIX, VALIDATOR_SUFFIX
+
+SETTLE_DELAY = 2000
+IGNORED_SUFFIXES = (PARTIAL_SUFFIX, PARTIAL_SUFFIX + VALIDATOR_SUFFIX, '.tmp', '.crdownload', '~')
+
+FileState = Tuple[int, float]
+
+
+def ignored(name: str) -> bool:
+    return name.startswith('.') or name.endswith(IGNORED_SUFFIXES)
+
+
+def fileState(path: str) -> Optional[FileState]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime
+
+
+class FolderWatcher(QtCore.QObject):
+    # Binds folders to tasks and emits `ready(taskId, paths)` for files that
+    # appear in them once they have stopped changing for SETTLE_DELAY ms.
+    # Files that settle together are emitted together. Everything is driven
+    # by filesystem notifications, the settle timer only runs while a new
+    # file is still being written.
+    ready = QtCore.Signal(int, list)
+
+    watcher: QtCore.QFileSystemWatcher
+    folders: Dict[str, int]
+    known: Dict[str, Set[str]]
+    pending: Dict[str, FileState]
+    timer: QtCore.QTimer
+
+    def __init__(self, parent: Optional[QtCore.QObject] = None) -> None:
+        super(FolderWatcher, self).__init__(parent)
+        self.folders = {}
+        self.known = {}
+        self.pending = {}
+
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.folderChanged)
+        self.watcher.fileChanged.connect(self.fileChanged)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(SETTLE_DELAY)
+        self.timer.timeout.connect(self.settle)
+
+    def watch(self, taskId: int, folder: str):
+        # Files already in the folder are left alone, only new ones are
+        # published.
+        folder = os.path.abspath(folder)
+        if not self.watcher.addPath(folder):
+            raise Exception("Could not watch " + folder)
+
+        self.folders[folder] = taskId
+        self.known[folder] = set(os.listdir(folder))
+
+    def unwatch(self, folder: str):
+        folder = os.path.abspath(folder)
+        if self.folders.pop(folder, None) is None:
+            return
+
+        self.watcher.removePath(folder)
+        del self.known[folder]
+        for path in [path for path in self.pending if os.path.dirname(path) == folder]:
+            self.forget(path)
+
+    def folderFor(self, taskId: int) -> Optional[str]:
+        for folder, id in self.folders.items():
+            if id == taskId:
+                return folder
+        return None
+
+    def forget(self, path: str):
+        self.pending.pop(path, None)
+        self.watcher.removePath(path)
+
+    @QtCore.Slot(str)
+    def folderChanged(self, folder: str):
+        known = self.known.get(folder)
+        if known is None:
+            return
+
+        try:
+            names = {entry.name for entry in os.scandir(folder) if entry.is_file()}
+        except OSError:
+            return
+
+        for name in known - names:
+            known.discard(name)
+            self.forget(os.path.join(folder, name))
+
+        added = False
+        for name in names - known:
+            if ignored(name):
+                continue
+            path = os.path.join(folder, name)
+            state = fileState(path)
+            if state is None:
+                continue
+            known.add(name)
+            self.pending[path] = state
+            self.watcher.addPath(path)
+            added = True
+
+        if added:
+            self.timer.start()
+
+    @QtCore.Slot(str)
+    def fileChanged(self, path: str):
+        if path in self.pending:
+            self.timer.start()
+
+    @QtCore.Slot()
+    def settle(self):
+        batches: Dict[int, List[str]] = {}
+        changed = False
+        for path, seen in list(self.pending.items()):
+            state = fileState(path)
+            if state is None:
+                self.forget(path)
+            elif state != seen:
+                self.pending[path] = state
+                changed = True
+            elif state[0] > 0:
+                # Empty files wait for a write notification instead.
+                self.forget(path)
+                taskId = self.folders[os.path.dirname(path)]
+                batches.setdefault(taskId, []).append(path)
+
+        if changed:
+            self.timer.start()
+
+        for taskId, paths in batches.items():
+            self.ready.emit(taskId, sorted(paths))